@@ -8,6 +8,10 @@ from epiweeks import Week
 from torch.optim import SGD, Adam, AdamW
 
 ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = ROOT / "cache"
+TUNING_DB = CACHE_DIR / "tuning.sqlite"  # indexed copy of the grid-search CSVs in results/tuning
+MODEL_CACHE_DIR = ROOT / "models" / "cache"
+MODEL_CACHE_MAX_BYTES = 20 * 1024**3  # fitted models are evicted (least recently used first) above this size
 
 ModelName = Literal["lightgbm", "tsmixer"]
 Mode = Literal["naive", "coupling", "discard", "oracle"]
@@ -145,8 +149,17 @@ SOURCE_DICT = {
 
 QUANTILES = [0.025, 0.1, 0.25, 0.5, 0.75, 0.9, 0.975]
 
-METRIC = [mql for _ in QUANTILES]
-METRIC_KWARGS = [{"q": q} for q in QUANTILES]
+# fixed category sets of the compact forecast schema (see load_data.compact_schema)
+LOCATIONS = ["DE"]
+AGE_GROUPS = ["00+", "00-04", "05-14", "15-34", "35-59", "60-79", "80+"]
+FORECAST_TYPES = ["quantile", "median", "mean"]
+
+# memory ceiling (bytes) of the chunks read by scoring_functions.stream_evaluate_models
+EVAL_MEMORY_LIMIT = 512 * 2**20
+
+# one vectorized call scores all quantile levels per window (WIS breakdown)
+METRIC = mql
+METRIC_KWARGS = {"q": QUANTILES}
 
 
 NUM_SAMPLES = 1000
@@ -161,7 +174,8 @@ SHARED_ARGS = dict(
         "enable_progress_bar": False,
         "enable_model_summary": False,
         "accelerator": "cpu",
-        "logger": False,
+        "logger": False,  # no lightning_logs/ and no checkpoints/ in the working directory
+        "enable_checkpointing": False,
     },
 )
 
@@ -5,6 +5,7 @@ import subprocess
 import papermill as pm
 
 from config import ROOT
+from src.columnar import convert_data
 from src.r_utils import detect_rscript
 
 # Headless plotting for matplotlib inside notebooks
@@ -23,6 +24,9 @@ for p in [
 ]:
     p.mkdir(parents=True, exist_ok=True)
 
+# Columnar copies of data/*.csv, read by the loaders in every notebook kernel
+convert_data()
+
 # Directories for code
 CODE_PY = ROOT / "code"
 CODE_R = ROOT / "r"
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+
+from config import CACHE_DIR
+
+
+@lru_cache(maxsize=None)
+def _file_hash(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_hash(path) -> str:
+    """SHA-256 of a file's content, recomputed only when its size or mtime changes."""
+    stat = os.stat(path)
+    return _file_hash(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def files_hash(paths) -> str:
+    """Combined content hash of several files (order-independent)."""
+    h = hashlib.sha256()
+    for path in sorted(map(str, paths)):
+        h.update(Path(path).name.encode())
+        h.update(file_hash(path).encode())
+    return h.hexdigest()[:16]
+
+
+def stable_hash(obj) -> str:
+    """Short, deterministic hash of a JSON-serializable object (non-serializable leaves use repr)."""
+    payload = json.dumps(obj, sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cache_path(namespace: str, name: str) -> Path:
+    return CACHE_DIR / namespace / name
+
+
+def read_pickle(path: Path):
+    """Return the unpickled object, or None if the file is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def write_pickle(path: Path, obj) -> None:
+    """Atomically pickle `obj` to `path` (safe with concurrent readers and writers)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
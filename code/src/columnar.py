@@ -0,0 +1,150 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, ROOT
+
+COLUMNAR_DIR = CACHE_DIR / "columnar"
+
+# string columns are stored as integer codes plus categories; these are decoded as dates on request
+DATE_COLUMNS = {"date", "forecast_date", "target_end_date"}
+
+
+def _layout_dir(path: Path) -> Path:
+    return COLUMNAR_DIR / Path(path).stem
+
+
+def _source_stat(path: Path) -> dict:
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns}
+
+
+def _save_npy(path: Path, values: np.ndarray) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, values, allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def write_columnar(df: pd.DataFrame, path: Path) -> None:
+    """
+    Store a frame read from the CSV at `path` as typed column blocks plus an index.json.
+
+    Columns sharing a dtype are stacked into one (column × row) .npy block, so each column is a
+    contiguous slice of a single memory map. String and date columns are stored as int32 codes
+    with their (ISO formatted) categories in the index.
+    """
+    out_dir = _layout_dir(path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    columns, blocks = [], {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s) and col not in DATE_COLUMNS:
+            entry = {"name": col, "kind": "numeric"}
+            values = s.to_numpy()
+        else:
+            entry = {"name": col, "kind": "date" if col in DATE_COLUMNS else "category"}
+            if entry["kind"] == "date":
+                s = pd.to_datetime(s).dt.strftime("%Y-%m-%d")
+            cat = pd.Categorical(s)
+            entry["categories"] = cat.categories.tolist()
+            values = cat.codes.astype(np.int32)
+        block = blocks.setdefault(values.dtype.str, [])
+        entry.update(block=values.dtype.str, pos=len(block))
+        block.append(values)
+        columns.append(entry)
+
+    files = {}
+    for i, (dtype, arrays) in enumerate(blocks.items()):
+        files[dtype] = f"block{i}.npy"
+        _save_npy(out_dir / files[dtype], np.stack(arrays))
+
+    # the index is written last: readers only trust a layout once it is present
+    index = {**_source_stat(path), "n_rows": len(df), "blocks": files, "columns": columns}
+    tmp = out_dir / f".index.json.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(index))
+    os.replace(tmp, out_dir / "index.json")
+
+
+def _read_index(path: Path) -> dict | None:
+    """Return the index of an up-to-date layout for the CSV at `path`, else None."""
+    try:
+        index = json.loads((_layout_dir(path) / "index.json").read_text())
+    except (OSError, ValueError):
+        return None
+    stat = _source_stat(path)
+    if any(index.get(k) != v for k, v in stat.items()):
+        return None
+    return index
+
+
+def read_columnar(path: Path, parse_dates=None, categorical=False) -> pd.DataFrame | None:
+    """
+    Read the memory-mapped columnar layout of the CSV at `path`, or return None if there is
+    no up-to-date layout.
+
+    By default the frame matches `pd.read_csv(path, parse_dates=parse_dates)`: columns are decoded
+    back to strings, or to datetimes for date columns listed in `parse_dates`.
+    With `categorical=True`, string and date columns are returned as pandas Categoricals instead.
+    """
+    index = _read_index(path)
+    if index is None:
+        return None
+
+    parse_dates = set(parse_dates or ())
+    layout = _layout_dir(path)
+    blocks = {k: np.load(layout / f, mmap_mode="r", allow_pickle=False) for k, f in index["blocks"].items()}
+
+    data = {}
+    for entry in index["columns"]:
+        values = blocks[entry["block"]][entry["pos"]]
+        name = entry["name"]
+        if entry["kind"] == "numeric":
+            data[name] = values
+            continue
+
+        categories = pd.Index(entry["categories"], dtype=object)
+        if entry["kind"] == "date" and name in parse_dates:
+            categories = pd.to_datetime(categories)
+        if categorical:
+            data[name] = pd.Categorical.from_codes(values, categories=categories)
+        elif (values >= 0).all():
+            data[name] = categories.take(values)
+        else:
+            data[name] = np.asarray(pd.Categorical.from_codes(values, categories=categories))
+
+    return pd.DataFrame(data)
+
+
+def read_table(path: Path, parse_dates=None, categorical=False) -> pd.DataFrame:
+    """Read a data file through its columnar layout, falling back to (and then converting) the CSV."""
+    df = read_columnar(path, parse_dates=parse_dates, categorical=categorical)
+    if df is not None:
+        return df
+
+    df = pd.read_csv(path, parse_dates=parse_dates)
+    try:
+        write_columnar(df, path)
+    except OSError:
+        return df  # e.g. read-only checkout: keep using the CSV
+
+    return read_columnar(path, parse_dates=parse_dates, categorical=categorical)
+
+
+def convert_data(data_dir: Path = ROOT / "data") -> list[Path]:
+    """Write (or refresh) the columnar layout for every CSV in `data_dir`."""
+    converted = []
+    for path in sorted(Path(data_dir).glob("*.csv")):
+        if _read_index(path) is None:
+            write_columnar(pd.read_csv(path), path)
+            converted.append(path)
+    return converted
+
+
+if __name__ == "__main__":
+    for p in convert_data():
+        print(f"✓ {p.name}")
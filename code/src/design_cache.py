@@ -0,0 +1,91 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+from darts import TimeSeries
+from darts.models import LightGBMModel
+
+from src.cache import stable_hash
+
+DESIGN_CACHE_SIZE = 8  # lagged training matrices kept per process
+
+_DESIGN_CACHE: OrderedDict = OrderedDict()
+
+
+def series_fingerprint(series) -> str | None:
+    """Content hash of a series or sequence of series (time index, values, components, static covariates)."""
+    if series is None or isinstance(series, str):
+        return series
+    if isinstance(series, TimeSeries):
+        series = [series]
+
+    h = hashlib.sha256()
+    for ts in series:
+        h.update(np.asarray(ts.time_index).tobytes())
+        h.update(np.ascontiguousarray(ts.all_values(copy=False)).tobytes())
+        h.update("|".join(map(str, ts.components)).encode())
+        if ts.has_static_covariates:
+            h.update(ts.static_covariates.to_csv().encode())
+    return h.hexdigest()[:16]
+
+
+def clear_design_cache() -> None:
+    _DESIGN_CACHE.clear()
+
+
+class CachedLightGBMModel(LightGBMModel):
+    """
+    LightGBMModel that reuses the lagged training matrix of identical training data.
+
+    darts re-tabularizes the series for every quantile of a quantile model, and a grid search
+    refits on the same data with the same lags; the matrix only depends on the lag and encoder
+    settings and the (encoded) series, so it is built once per process and shared read-only.
+    """
+
+    def _create_lagged_data(
+        self,
+        series,
+        past_covariates,
+        future_covariates,
+        max_samples_per_ts,
+        sample_weight=None,
+        stride=1,
+        last_static_covariates_shape=None,
+    ):
+        key = stable_hash(
+            dict(
+                lags={kind: self._get_lags(kind) for kind in ("target", "past", "future")},
+                output_chunk_length=self.output_chunk_length,
+                output_chunk_shift=self.output_chunk_shift,
+                multi_models=self.multi_models,
+                static_covariates=self.uses_static_covariates,
+                last_static_covariates_shape=last_static_covariates_shape,
+                max_samples_per_ts=max_samples_per_ts,
+                stride=stride,
+                data=[series_fingerprint(s) for s in (series, past_covariates, future_covariates, sample_weight)],
+            )
+        )
+
+        entry = _DESIGN_CACHE.get(key)
+        if entry is None:
+            X, y, w = super()._create_lagged_data(
+                series=series,
+                past_covariates=past_covariates,
+                future_covariates=future_covariates,
+                max_samples_per_ts=max_samples_per_ts,
+                sample_weight=sample_weight,
+                stride=stride,
+                last_static_covariates_shape=last_static_covariates_shape,
+            )
+            for arr in (X, y, w):
+                if arr is not None:
+                    arr.setflags(write=False)  # shared between fits
+            entry = (X, y, w, self._static_covariates_shape)
+            _DESIGN_CACHE[key] = entry
+            while len(_DESIGN_CACHE) > DESIGN_CACHE_SIZE:
+                _DESIGN_CACHE.popitem(last=False)
+        else:
+            _DESIGN_CACHE.move_to_end(key)
+
+        X, y, w, self._static_covariates_shape = entry
+        return X, y, w
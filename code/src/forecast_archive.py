@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import ROOT
+from src.cache import cache_path, read_pickle, write_pickle
+
+FORECAST_DIR = ROOT / "forecasts"
+ARCHIVE_CACHE = cache_path("forecasts", "archive.pkl")
+
+FORECAST_DTYPES = {
+    "location": str,
+    "age_group": str,
+    "forecast_date": str,
+    "target_end_date": str,
+    "horizon": "int64",
+    "type": str,
+    "quantile": "float64",
+    "value": "float64",
+}
+STRING_COLUMNS = [c for c, dtype in FORECAST_DTYPES.items() if dtype is str]
+
+
+def scan_forecasts(forecast_dir: Path = FORECAST_DIR) -> pd.DataFrame:
+    """
+    Manifest of the forecast archive: one row per CSV with its path (relative to `forecast_dir`),
+    size, mtime_ns, model and forecast_date, both parsed from the file name
+    (<forecast_date>-<source>-<disease>-<model>.csv). Only file metadata is read.
+    """
+    rows = []
+    for dirpath, dirnames, filenames in os.walk(forecast_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))  # e.g. .ipynb_checkpoints
+        for name in sorted(filenames):
+            if not name.endswith(".csv"):
+                continue
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            parts = name[: -len(".csv")].split("-", 5)
+            rows.append(
+                {
+                    "path": os.path.relpath(path, forecast_dir),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "model": parts[-1],
+                    "forecast_date": "-".join(parts[:3]),
+                }
+            )
+    return pd.DataFrame(rows, columns=["path", "size", "mtime_ns", "model", "forecast_date"])
+
+
+def _read_forecast(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=FORECAST_DTYPES)
+
+
+def _parse(files: pd.DataFrame, forecast_dir: Path, n_jobs: int | None) -> list[pd.DataFrame]:
+    paths = [forecast_dir / p for p in files["path"]]
+    n_jobs = n_jobs or min(8, os.cpu_count() or 1)
+    if n_jobs == 1 or len(paths) <= 1:
+        return [_read_forecast(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=n_jobs) as ex:
+        return list(ex.map(_read_forecast, paths))
+
+
+def _refresh_archive(files: pd.DataFrame, forecast_dir: Path, n_jobs: int | None) -> dict:
+    """
+    The consolidated cache, updated for `files`: only new or changed CSVs are parsed, rows of
+    files that no longer exist are dropped. Each file's rows are a contiguous slice of `data`,
+    whose string columns are stored as categoricals.
+    """
+    archive = read_pickle(ARCHIVE_CACHE)
+    if archive is None or archive["root"] != str(forecast_dir):
+        archive = {"root": str(forecast_dir), "files": {}, "data": pd.DataFrame(columns=list(FORECAST_DTYPES))}
+    cached, data = archive["files"], archive["data"]
+
+    selected = set(files["path"])
+    stale = files[[cached.get(p, {}).get("stat") != (s, m) for p, s, m in files[["path", "size", "mtime_ns"]].values]]
+    removed = {p for p in cached if p not in selected and not (forecast_dir / p).exists()}
+    if stale.empty and not removed:
+        return archive
+
+    keep = [p for p in cached if p not in removed and p not in set(stale["path"])]
+    parts = [data.iloc[cached[p]["start"] : cached[p]["stop"]] for p in keep]
+    stats = [cached[p]["stat"] for p in keep]
+    parts += _parse(stale, forecast_dir, n_jobs)
+    stats += [(s, m) for s, m in stale[["size", "mtime_ns"]].values]
+
+    bounds = np.cumsum([0] + [len(p) for p in parts])
+    entries = {
+        p: {"stat": tuple(int(v) for v in stat), "start": int(start), "stop": int(stop)}
+        for p, stat, start, stop in zip(keep + list(stale["path"]), stats, bounds[:-1], bounds[1:])
+    }
+    data = pd.concat(parts, ignore_index=True).astype(dict.fromkeys(STRING_COLUMNS, "category")) if parts else data
+    archive = {"root": str(forecast_dir), "files": entries, "data": data}
+    try:
+        write_pickle(ARCHIVE_CACHE, archive)
+    except OSError:
+        pass  # e.g. read-only checkout: the archive is rebuilt in memory next time
+    return archive
+
+
+def read_forecasts(
+    files: pd.DataFrame,
+    forecast_dir: Path = FORECAST_DIR,
+    n_jobs: int | None = None,
+    use_cache: bool = True,
+    categorical: bool = False,
+    with_path: bool = False,
+) -> pd.DataFrame:
+    """
+    Rows of the forecast CSVs listed in `files` (a selection of `scan_forecasts`), with their
+    `model` column. CSVs are parsed in a thread pool (`n_jobs` threads) with explicit dtypes;
+    with `use_cache` they are read from the consolidated cache, where only new or changed files
+    are parsed. With `categorical=True`, string columns are returned as pandas Categoricals.
+    With `with_path=True`, each row also gets the `path` of its CSV.
+    """
+    string_columns = [*STRING_COLUMNS, "model", *(["path"] if with_path else [])]
+    if files.empty:
+        df = pd.DataFrame(columns=list(FORECAST_DTYPES) + string_columns[len(STRING_COLUMNS) :])
+        df = df.astype({**FORECAST_DTYPES, **dict.fromkeys(string_columns, str)})
+        return df.astype(dict.fromkeys(string_columns, "category")) if categorical else df
+
+    if not use_cache:
+        frames = _parse(files, forecast_dir, n_jobs)
+        sizes = [len(f) for f in frames]
+        df = pd.concat(frames, ignore_index=True)
+    else:
+        archive = _refresh_archive(files, forecast_dir, n_jobs)
+        entries = [archive["files"][p] for p in files["path"]]
+        sizes = [e["stop"] - e["start"] for e in entries]
+        rows = np.concatenate([np.arange(e["start"], e["stop"]) for e in entries])
+        df = archive["data"].take(rows).reset_index(drop=True)
+
+    for col in string_columns[len(STRING_COLUMNS) :]:
+        values = pd.Categorical(files[col])
+        df[col] = pd.Categorical.from_codes(np.repeat(values.codes, sizes), values.categories)
+    return df.astype(dict.fromkeys(string_columns, "category" if categorical else object))
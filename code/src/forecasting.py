@@ -2,11 +2,18 @@ from src.silence import silence
 
 silence()
 
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Dict, List, Sequence, Tuple, Union
+from typing import Callable, Dict, List, Literal, Sequence, Tuple, Union
 
+import darts
+import numpy as np
 import pandas as pd
-from darts import concatenate
+from darts import TimeSeries, concatenate
 from darts.models import LightGBMModel, TSMixerModel
 from tqdm import tqdm
 
@@ -27,12 +34,19 @@ from config import (
     Mode,
     ModelName,
 )
-from src.load_data import encode_static_covariates, reshape_forecast
+from src.cache import files_hash, stable_hash
+from src.design_cache import CachedLightGBMModel
+from src.load_data import add_truth, encode_static_covariates, reshape_forecast
+from src.manifest import append_manifest, is_complete, read_manifest
+from src.model_cache import evict_models, load_cached_model, model_key, save_cached_model
 from src.realtime_utils import (
     load_nowcast,
     load_realtime_training_data,
     make_target_paths,
+    source_files,
+    training_vintage_hash,
 )
+from src.scoring_functions import compute_wis
 from src.tuning import exclude_covid_weights, get_best_parameters
 
 MODEL_REGISTRY = {
@@ -40,6 +54,8 @@ MODEL_REGISTRY = {
     "tsmixer": TSMixerModel,
 }
 
+Combine = Literal["mixture", "vincentization"]
+
 
 # core (pure, no I/O)
 def compute_forecast(
@@ -56,6 +72,8 @@ def compute_forecast(
     # defaults
     horizon: int = HORIZON,
     num_samples: int = NUM_SAMPLES,
+    direct_quantiles: bool = False,
+    combine: Combine = "mixture",
 ) -> pd.DataFrame:
     """
     Pure forecasting wrapper (no I/O).
@@ -63,58 +81,209 @@ def compute_forecast(
       - 'coupling': build sample-path targets from as-of targets + nowcast.
       - 'discard': like 'coupling' but drop the last data point
       - 'oracle': truncate fully corrected targets at forecast_date (no nowcast).
+
+    By default, `num_samples` samples are drawn per series and the sample paths of
+    coupling/discard are pooled before taking quantiles. With `direct_quantiles=True`
+    (quantile-regression models only, i.e. LightGBM), the predicted QUANTILES are used
+    directly and the per-path forecasts are combined analytically (see `mix_quantile_forecasts`).
+
+    To forecast several modes with the same model, use `compute_forecasts` (one predict call).
+    """
+    return compute_forecasts(
+        model,
+        modes=[mode],
+        targets=targets,
+        covariates=covariates,
+        ts_nowcast=ts_nowcast,
+        complete_targets=complete_targets,
+        forecast_date=forecast_date,
+        horizon=horizon,
+        num_samples=num_samples,
+        direct_quantiles=direct_quantiles,
+        combine=combine,
+    )[mode]
+
+
+def compute_forecasts(
+    model,
+    *,
+    modes: Sequence[Mode],
+    targets=None,
+    covariates=None,
+    ts_nowcast=None,
+    complete_targets=None,
+    forecast_date=None,
+    horizon: int = HORIZON,
+    num_samples: int = NUM_SAMPLES,
+    direct_quantiles: bool = False,
+    combine: Combine = "mixture",
+) -> Dict[Mode, pd.DataFrame]:
+    """
+    Forecast several modes with a single `model.predict` call; see `compute_forecast`.
+
+    The input series of all modes (naive series, coupling/discard sample paths, oracle series)
+    are stacked into one list, predicted together and split back per mode.
     """
-    if mode not in ("naive", "coupling", "discard", "oracle"):
+    if any(m not in ("naive", "coupling", "discard", "oracle") for m in modes):
         raise ValueError("mode must be one of {'naive','coupling','discard','oracle'}.")
 
-    if mode == "naive":
-        series_for_model = targets
-        covs_for_model = covariates
+    series_per_mode: Dict[Mode, List[TimeSeries]] = {}
+    paths = None
+    for mode in modes:
+        if mode == "naive":
+            series_per_mode[mode] = [targets]
 
-    elif mode in {"coupling", "discard"}:
-        if targets is None or ts_nowcast is None:
-            raise ValueError("coupling/discard require `targets` (as-of) and `ts_nowcast`.")
-        target_list = make_target_paths(targets, ts_nowcast)
-        target_list = [encode_static_covariates(t, ordinal=False) for t in target_list]
-        if mode == "discard":
-            target_list = [t[:-1] for t in target_list]  # discard last data point
-        series_for_model = target_list
-        covs_for_model = [covariates] * len(target_list) if covariates is not None else None
-
-    else:  # "oracle"
-        if complete_targets is None:
-            raise ValueError("oracle requires `complete_targets` (fully corrected).")
-        ts_cut = complete_targets[: pd.Timestamp(forecast_date)]
-        ts_cut = encode_static_covariates(ts_cut, ordinal=False)
-        series_for_model = ts_cut
-        covs_for_model = covariates
-
-    fct = model.predict(
-        n=horizon,
-        series=series_for_model,
-        past_covariates=covs_for_model,
-        num_samples=num_samples,
-    )
+        elif mode in {"coupling", "discard"}:
+            if targets is None or ts_nowcast is None:
+                raise ValueError("coupling/discard require `targets` (as-of) and `ts_nowcast`.")
+            if paths is None:
+                paths = make_target_paths(targets, ts_nowcast, encode=True)
+            # discard: drop the last data point
+            series_per_mode[mode] = paths if mode == "coupling" else [t[:-1] for t in paths]
 
-    ts_forecast = concatenate(fct, axis="sample") if isinstance(fct, list) else fct
-    df = reshape_forecast(ts_forecast)
+        else:  # "oracle"
+            if complete_targets is None:
+                raise ValueError("oracle requires `complete_targets` (fully corrected).")
+            ts_cut = complete_targets[: pd.Timestamp(forecast_date)]
+            series_per_mode[mode] = [encode_static_covariates(ts_cut, ordinal=False)]
+
+    series = [ts for m in modes for ts in series_per_mode[m]]
+    covs = [covariates] * len(series) if covariates is not None else None
+
+    if direct_quantiles:
+        quantiles = getattr(getattr(model, "likelihood", None), "quantiles", None)
+        if quantiles is None or list(quantiles) != QUANTILES:
+            raise ValueError("direct_quantiles requires a model trained with likelihood='quantile' on QUANTILES.")
+        fct = model.predict(n=horizon, series=series, past_covariates=covs, predict_likelihood_parameters=True)
+    else:
+        fct = model.predict(n=horizon, series=series, past_covariates=covs, num_samples=num_samples)
 
-    df["forecast_date"] = pd.Timestamp(forecast_date)
-    if mode == "discard":
-        df["horizon"] = df["horizon"] - 1
-    return df
+    out = {}
+    start = 0
+    for mode in modes:
+        n = len(series_per_mode[mode])
+        fct_mode, start = fct[start : start + n], start + n
+
+        if direct_quantiles:
+            ts_forecast = mix_quantile_forecasts(fct_mode, method=combine) if n > 1 else fct_mode[0]
+            df = reshape_forecast(ts_forecast, quantile_components=True)
+        else:
+            ts_forecast = concatenate(fct_mode, axis="sample") if n > 1 else fct_mode[0]
+            df = reshape_forecast(ts_forecast)
+
+        df["forecast_date"] = pd.Timestamp(forecast_date)
+        if mode == "discard":
+            df["horizon"] = df["horizon"] - 1
+        out[mode] = df
+
+    return out
 
 
 # helpers
+def mix_quantile_forecasts(forecasts: List[TimeSeries], method: Combine = "mixture") -> TimeSeries:
+    """
+    Combine per-path quantile forecasts (one component per target and quantile level, as
+    returned with `predict_likelihood_parameters=True`) into a single quantile forecast.
+
+      - 'mixture': quantiles of the equally weighted mixture of the path distributions, each
+        given by linear interpolation of its predicted quantiles. This is what pooling the
+        samples of all paths approximates. Beyond its outermost quantiles, each path's CDF is
+        extended linearly (with the slope of its outer segment) until it reaches 0 or 1, instead
+        of putting the tail mass on the outermost quantile.
+      - 'vincentization': average of the path quantiles per level.
+
+    Predicted quantiles are sorted per path first, so crossing quantiles cannot break the CDF.
+    """
+    if method not in ("mixture", "vincentization"):
+        raise ValueError("method must be one of {'mixture','vincentization'}.")
+
+    levels = np.asarray(QUANTILES)
+    # (path, time, target, level)
+    values = np.stack([f.values(copy=False) for f in forecasts])
+    values = np.sort(values.reshape(*values.shape[:2], -1, len(levels)), axis=-1)
+
+    if method == "vincentization":
+        mixed = values.mean(axis=0)
+    else:
+        n_paths, n_times, n_targets, _ = values.shape
+        n_rows = n_times * n_targets
+
+        # knots of each path's CDF incl. the points where its linear tails reach 0 and 1
+        lower = values[..., 0] - levels[0] * (values[..., 1] - values[..., 0]) / (levels[1] - levels[0])
+        upper = values[..., -1] + (1 - levels[-1]) * (values[..., -1] - values[..., -2]) / (levels[-1] - levels[-2])
+        knots = np.concatenate([lower[..., None], values, upper[..., None]], axis=-1)
+        knots = knots.transpose(1, 2, 0, 3).reshape(n_rows, n_paths, -1)  # (time × target, path, knot)
+        knot_levels = np.concatenate([[0.0], levels, [1.0]])
+
+        # the mixture CDF is linear between the knots of all paths: sweep over them in order, each knot
+        # changing the density of its path (zero-width segments are point masses, i.e. jumps)
+        mass = np.diff(knot_levels)
+        width = np.diff(knots, axis=-1)
+        point = width <= 0
+        density = np.divide(mass, width, out=np.zeros_like(width), where=~point)
+        edge = np.zeros((n_rows, n_paths, 1))
+        slope = np.diff(np.concatenate([edge, density, edge], axis=-1), axis=-1).reshape(n_rows, -1)
+        jump = np.concatenate([np.where(point, mass, 0.0), edge], axis=-1).reshape(n_rows, -1)
+
+        order = np.argsort(knots.reshape(n_rows, -1), axis=-1, kind="stable")
+        grid = np.take_along_axis(knots.reshape(n_rows, -1), order, axis=-1)  # (time × target, knot)
+        slope = np.take_along_axis(slope, order, axis=-1) / n_paths
+        jump = np.take_along_axis(jump, order, axis=-1) / n_paths
+        rise = np.cumsum(slope, axis=-1)[:, :-1] * np.diff(grid, axis=-1)
+        after = np.cumsum(jump + np.pad(rise, ((0, 0), (1, 0))), axis=-1)
+        # left limit and value at every knot, so that jumps become flat stretches of the inverse
+        cdf = np.maximum.accumulate(np.stack([after - jump, after], axis=-1).reshape(n_rows, -1), axis=-1)
+
+        # invert all rows at once, row r shifted by 2 r in level
+        r = 2.0 * np.arange(n_rows)[:, None]
+        mixed = np.interp((levels + r).ravel(), (cdf + r).ravel(), np.repeat(grid, 2, axis=-1).ravel())
+
+    return forecasts[0].with_values(mixed.reshape(values.shape[1], -1, 1))
+
+
+class SeedAccumulator:
+    """
+    Running mean over the per-seed forecasts of one mode.
+
+    The first forecast fixes the row layout (stratum × horizon × quantile, in output order); each
+    further forecast is only added into a preallocated float buffer, so seed frames can be dropped
+    as soon as they are added. `result` builds the long frame once.
+    """
+
+    KEYS = ["location", "age_group", "forecast_date", "target_end_date", "horizon", "type", "quantile"]
+    ORDER = ["location", "age_group", "horizon", "quantile"]
+
+    def __init__(self):
+        self.keys: pd.DataFrame | None = None
+        self.order: np.ndarray | None = None
+        self.total: np.ndarray | None = None
+        self.n = 0
+
+    def add(self, df: pd.DataFrame) -> None:
+        if self.keys is None:
+            self.order = np.lexsort([df[c].to_numpy() for c in reversed(self.ORDER)])
+            self.keys = df[self.KEYS].iloc[self.order].reset_index(drop=True)
+            self.total = np.zeros(len(df))
+        elif len(df) != len(self.keys) or not all(
+            np.array_equal(df[c].to_numpy()[self.order], self.keys[c].to_numpy()) for c in self.ORDER
+        ):
+            raise ValueError("All seeds must forecast the same strata, horizons and quantiles.")
+
+        self.total += df["value"].to_numpy(dtype=float)[self.order]
+        self.n += 1
+
+    def result(self) -> pd.DataFrame:
+        if self.keys is None:
+            raise ValueError("No forecasts were added.")
+        return self.keys.assign(value=self.total / self.n)
+
+
 def aggregate_runs(dfs: List[pd.DataFrame]) -> pd.DataFrame:
-    return (
-        pd.concat(dfs, ignore_index=True)
-        .groupby(
-            ["location", "age_group", "forecast_date", "target_end_date", "horizon", "type", "quantile"], as_index=False
-        )["value"]
-        .mean()
-        .sort_values(["location", "age_group", "horizon", "quantile"])
-    )
+    """Mean forecast over seeds; see `SeedAccumulator`."""
+    acc = SeedAccumulator()
+    for df in dfs:
+        acc.add(df)
+    return acc.result()
 
 
 def save_csv(df: pd.DataFrame, out_dir: Path, filename: str) -> None:
@@ -122,9 +291,45 @@ def save_csv(df: pd.DataFrame, out_dir: Path, filename: str) -> None:
     df.to_csv(out_dir / filename, index=False)
 
 
-def fit_model(model, targets, covariates, params, use_covariates, use_encoders, weights, seed):
+def fit_model(
+    model,
+    targets,
+    covariates,
+    params,
+    use_covariates,
+    use_encoders,
+    weights,
+    seed,
+    n_threads=None,
+    init_model=None,
+    warm_start: int = 0,
+):
+    """
+    Fit a fresh model, or continue training `init_model` (updated in place) on the new data:
+    LightGBM boosts `warm_start` extra rounds per estimator, TSMixer is fine-tuned for
+    `warm_start` epochs.
+    """
+    if init_model is not None:
+        if model == "lightgbm":
+            return _continue_lightgbm(
+                init_model, targets, covariates if use_covariates else None, weights, warm_start, n_threads
+            )
+        init_model.fit(
+            targets,
+            past_covariates=covariates if use_covariates else None,
+            sample_weight=weights,
+            epochs=warm_start,
+            dataloader_kwargs={
+                "pin_memory": False,
+                "num_workers": 0,
+            },
+        )
+        return init_model
+
     if model == "lightgbm":
-        mdl = LightGBMModel(
+        if n_threads is not None:
+            params = {**params, "n_jobs": n_threads}
+        mdl = CachedLightGBMModel(
             **params,
             output_chunk_length=HORIZON,
             add_encoders=ENCODERS if use_encoders else None,
@@ -158,6 +363,143 @@ def fit_model(model, targets, covariates, params, use_covariates, use_encoders,
     return mdl
 
 
+WARM_START_DARTS = "0.36"  # darts minor version the LightGBM continuation is written against (pinned)
+
+
+def _check_darts_internals(mdl: LightGBMModel) -> None:
+    """Fail loudly if the darts internals used by `_continue_lightgbm` may have changed."""
+    version = ".".join(darts.__version__.split(".")[:2])
+    missing = [a for a in ("_create_lagged_data", "_model_container", "generate_fit_encodings") if not hasattr(mdl, a)]
+    if not missing and not all(
+        hasattr(est, "booster_") for c in mdl._model_container.values() for est in getattr(c, "estimators_", [None])
+    ):
+        missing.append("estimators_[i].booster_")
+    if version != WARM_START_DARTS or missing:
+        raise RuntimeError(
+            f"Warm-starting LightGBM relies on darts {WARM_START_DARTS}.x internals, found darts "
+            f"{darts.__version__}{f' without {missing}' if missing else ''}. Pin darts or use warm_start=0."
+        )
+
+
+def _continue_lightgbm(mdl: LightGBMModel, targets, covariates, weights, rounds: int, n_threads=None) -> LightGBMModel:
+    """
+    Add `rounds` boosting rounds to every estimator (quantile × output) of a fitted LightGBMModel.
+
+    darts has no public API for this (`fit(init_model=...)` would pass one booster to all
+    estimators): the training matrix is built with the model's own tabularization and each
+    booster is passed to LightGBM as `init_model`. This uses darts internals, so the darts
+    version is pinned and checked.
+    """
+    _check_darts_internals(mdl)
+    series = [targets]
+    past = [covariates] if covariates is not None else None
+    future = None
+    if mdl.encoders is not None and mdl.encoders.encoding_available:
+        past, future = mdl.generate_fit_encodings(series=series, past_covariates=past)
+    if isinstance(weights, TimeSeries):
+        weights = [weights]
+
+    X, y, w = mdl._create_lagged_data(
+        series=series, past_covariates=past, future_covariates=future, max_samples_per_ts=None, sample_weight=weights
+    )
+    for container in mdl._model_container.values():
+        for i, est in enumerate(container.estimators_):
+            est.set_params(n_estimators=rounds, **({"n_jobs": n_threads} if n_threads is not None else {}))
+            est.fit(X, y[:, i], sample_weight=None if w is None else w[:, i], init_model=est.booster_)
+    return mdl
+
+
+def load_training_data(as_of, sample_weight: str):
+    """Complete training targets and covariates as of `as_of`, plus the sample weights to fit with."""
+    targets, covariates = load_realtime_training_data(as_of=as_of, drop_incomplete=True)
+    weights = exclude_covid_weights(targets) if sample_weight == "no-covid" else sample_weight
+    return targets, covariates, weights
+
+
+def model_spec(fd: str, *, params: dict, data_mode: DataMode, warm_start: int = 0, full_retrain_every: int = 4) -> dict:
+    """
+    Model-cache fields (see `model_key`) of the model used for forecast date `fd`.
+
+    With `warm_start`, the model of `fd` continues training from the model of the preceding
+    date in FORECAST_DATES, except on every `full_retrain_every`-th date, where it is fitted from
+    scratch. The position in FORECAST_DATES (not in the requested dates) decides, so a chain is
+    the same whichever subset of dates is run.
+    """
+    spec = dict(params=params, data_mode=data_mode, vintage=training_vintage_hash(fd))
+    i = FORECAST_DATES.index(fd) if fd in FORECAST_DATES else 0
+    if warm_start and i % full_retrain_every != 0:
+        prev = FORECAST_DATES[i - 1]
+        spec["warm_start"] = dict(
+            rounds=warm_start,
+            date=prev,
+            previous=model_spec(
+                prev, params=params, data_mode=data_mode, warm_start=warm_start, full_retrain_every=full_retrain_every
+            ),
+        )
+    return spec
+
+
+def load_or_fit_model(
+    model: ModelName,
+    seed: int,
+    spec: dict,
+    *,
+    targets,
+    covariates,
+    params: dict,
+    use_covariates: bool,
+    use_encoders: bool,
+    weights,
+    n_threads: int | None = None,
+):
+    """
+    Return the fitted model described by `spec` from the model cache, fitting (and caching) it on a miss.
+
+    A warm-started model continues from the model of the preceding date, which is loaded or
+    fitted (recursively) the same way.
+    """
+    key = model_key(model, seed=seed, **spec)
+    mdl = load_cached_model(model, key)
+    if mdl is not None:
+        return mdl
+
+    init_model, rounds = None, 0
+    warm = spec.get("warm_start")
+    if warm is not None:
+        prev_targets, prev_covariates, prev_weights = load_training_data(
+            warm["date"], DATA_MODE_CONFIG[spec["data_mode"]][1]
+        )
+        init_model = load_or_fit_model(
+            model,
+            seed,
+            warm["previous"],
+            targets=prev_targets,
+            covariates=prev_covariates,
+            params=params,
+            use_covariates=use_covariates,
+            use_encoders=use_encoders,
+            weights=prev_weights,
+            n_threads=n_threads,
+        )
+        rounds = warm["rounds"]
+
+    mdl = fit_model(
+        model,
+        targets,
+        covariates,
+        params,
+        use_covariates,
+        use_encoders,
+        weights,
+        seed,
+        n_threads=n_threads,
+        init_model=init_model,
+        warm_start=rounds,
+    )
+    save_cached_model(mdl, key)
+    return mdl
+
+
 def print_training_config(
     *, model_name, use_covariates, sample_weight, modes, seeds, params, wis, forecast_dates
 ) -> None:
@@ -177,6 +519,335 @@ def print_training_config(
     print(f"\n  Validation score : {wis:.3f}\n=======================\n")
 
 
+def run_seed(
+    seed: int,
+    *,
+    model: ModelName,
+    forecast_date: str,
+    modes: Sequence[Mode],
+    targets_train,
+    covars_train,
+    params: dict,
+    use_covariates: bool,
+    use_encoders: bool,
+    weights,
+    targets_asof,
+    covars_asof,
+    ts_nowcast=None,
+    complete_targets=None,
+    model_name: str | None = None,
+    predict_kwargs: dict | None = None,
+    n_threads: int | None = None,
+    model_cache: dict | None = None,
+) -> Dict[Mode, pd.DataFrame]:
+    """
+    Fit one model for `seed` and return its forecast per mode.
+
+    If `model_cache` is given (see `model_spec`), the fitted model is taken from the model cache
+    under ROOT/models/cache and only fitted (and cached) on a miss.
+    If `model_name` is given, the fitted model is saved (clean=True) under ROOT/models/<date>/...
+    """
+    fd = forecast_date
+    predict_kwargs = predict_kwargs or {}
+
+    if model_cache is not None:
+        mdl = load_or_fit_model(
+            model,
+            seed,
+            model_cache,
+            targets=targets_train,
+            covariates=covars_train,
+            params=params,
+            use_covariates=use_covariates,
+            use_encoders=use_encoders,
+            weights=weights,
+            n_threads=n_threads,
+        )
+    else:
+        mdl = fit_model(
+            model, targets_train, covars_train, params, use_covariates, use_encoders, weights, seed, n_threads=n_threads
+        )
+
+    if model_name is not None:
+        model_path = ROOT / "models" / fd / f"{fd}-{model_name}-{seed}.pkl"
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        mdl.save(str(model_path), clean=True)
+
+    covars_for_predict = None if not getattr(mdl, "uses_past_covariates", True) else covars_asof
+
+    return compute_forecasts(
+        mdl,
+        modes=modes,
+        targets=targets_asof,
+        covariates=covars_for_predict,
+        ts_nowcast=ts_nowcast,
+        complete_targets=complete_targets,
+        forecast_date=fd,
+        **predict_kwargs,
+    )
+
+
+# process-pool workers: the as-of data is sent once per worker via the initializer
+_WORKER_CONTEXT: dict = {}
+
+
+def _init_seed_worker(context: dict, n_threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(n_threads)
+    _WORKER_CONTEXT.clear()
+    _WORKER_CONTEXT.update(context, n_threads=n_threads)
+
+
+def _run_seed_in_worker(seed: int) -> Dict[Mode, pd.DataFrame]:
+    return run_seed(seed, **_WORKER_CONTEXT)
+
+
+def run_seeds_parallel(
+    seeds,
+    context: dict,
+    on_result: Callable[[Dict[Mode, pd.DataFrame]], None],
+    n_jobs: int = -1,
+    desc: str | None = None,
+    n_cpus: int | None = None,
+) -> None:
+    """
+    Run `run_seed` for all seeds in a pool of `n_jobs` worker processes (-1: one per CPU).
+
+    Each worker receives `context` once and caps LightGBM/torch to its share of the `n_cpus`
+    CPUs (default: all), so the pool does not oversubscribe cores. Every seed's result is passed
+    to `on_result` as soon as it completes (in completion order) and is not kept.
+    """
+    n_cpus = n_cpus or os.cpu_count() or 1
+    n_workers = min(len(seeds), n_cpus if n_jobs == -1 else n_jobs)
+    n_threads = max(1, n_cpus // n_workers)
+
+    # spawn: forking after LightGBM/torch have started their OpenMP thread pools can deadlock
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_seed_worker,
+        initargs=(context, n_threads),
+    ) as ex:
+        futures = [ex.submit(_run_seed_in_worker, seed) for seed in seeds]
+        for fut in tqdm(as_completed(futures), total=len(futures), desc=desc, leave=False):
+            on_result(fut.result())
+
+
+def forecast_date_job(
+    fd: str,
+    *,
+    model: ModelName,
+    model_name: str,
+    modes: Sequence[Mode],
+    params: dict,
+    use_covariates: bool,
+    use_encoders: bool,
+    sample_weight: str,
+    seeds,
+    complete_targets=None,
+    save_models: bool = False,
+    predict_kwargs: dict | None = None,
+    data_mode: DataMode = "all",
+    use_model_cache: bool = True,
+    warm_start: int = 0,
+    full_retrain_every: int = 4,
+    n_jobs: int = 1,
+    n_cpus: int | None = None,
+) -> Dict[Mode, Path]:
+    """
+    Train all seeds for one forecast date and export one CSV per mode; returns the CSV paths.
+
+    With `use_model_cache`, fitted models are reused from (and added to) the model cache
+    (optionally warm-started, see `model_spec`).
+    `n_cpus` is the CPU budget of this job (default: all CPUs).
+    """
+    print(f"→ {fd}")
+    start = time.perf_counter()
+
+    # Training data (complete up to fd) + weights
+    targets_train, covars_train, weights = load_training_data(fd, sample_weight)
+
+    # As-of data (may include incomplete values)
+    targets_asof, covars_asof = load_realtime_training_data(as_of=fd, drop_incomplete=False)
+
+    # Nowcast per date for coupling/discard
+    ts_now = None
+    if any(m in ("coupling", "discard") for m in modes):
+        ts_now = load_nowcast(forecast_date=fd)
+
+    # Fit one model per seed and forecast all requested modes
+    context = dict(
+        model=model,
+        forecast_date=fd,
+        modes=modes,
+        targets_train=targets_train,
+        covars_train=covars_train,
+        params=params,
+        use_covariates=use_covariates,
+        use_encoders=use_encoders,
+        weights=weights,
+        targets_asof=targets_asof,
+        covars_asof=covars_asof,
+        ts_nowcast=ts_now,
+        complete_targets=complete_targets,
+        model_name=model_name if save_models else None,
+        predict_kwargs=predict_kwargs,
+        model_cache=(
+            model_spec(
+                fd,
+                params=dict(params, use_encoders=use_encoders),
+                data_mode=data_mode,
+                warm_start=warm_start,
+                full_retrain_every=full_retrain_every,
+            )
+            if use_model_cache
+            else None
+        ),
+    )
+    # Average over seeds as they finish
+    accumulators = {m: SeedAccumulator() for m in modes}
+
+    def add_run(run: Dict[Mode, pd.DataFrame]) -> None:
+        for m in modes:
+            accumulators[m].add(run[m])
+
+    if n_jobs == 1:
+        n_threads = n_cpus if n_cpus is not None and n_cpus < (os.cpu_count() or 1) else None
+        for seed in tqdm(seeds, desc=f"{fd}", leave=False):
+            add_run(run_seed(seed, **context, n_threads=n_threads))
+    else:
+        run_seeds_parallel(seeds, context, add_run, n_jobs=n_jobs, desc=fd, n_cpus=n_cpus)
+
+    # Export per mode
+    paths = {}
+    for m in modes:
+        df = accumulators[m].result()
+        out_dir = ROOT / "forecasts" / f"{model_name}-{m}"
+        fname = f"{fd}-icosari-sari-{model_name}-{m}.csv"
+        save_csv(df, out_dir, fname)
+        paths[m] = out_dir / fname
+
+    print(f"✓ {fd} ({time.perf_counter() - start:.1f}s)")
+    return paths
+
+
+def _init_date_worker(n_threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(n_threads)
+
+
+def run_date_jobs(
+    forecast_dates: Sequence[str],
+    job: dict,
+    *,
+    date_jobs: int = 1,
+    max_retries: int = 2,
+    retry_backoff: float = 30.0,
+    on_success: Callable[[str, Dict[Mode, Path]], None] | None = None,
+) -> List[Tuple[str, str]]:
+    """
+    Run `forecast_date_job` for every date, serially or in a pool of `date_jobs` processes.
+
+    A failed date is retried up to `max_retries` times, `retry_backoff * 2**k` seconds after its
+    k-th failure; retries are scheduled by this process, so waiting does not occupy a worker.
+    If a worker dies (e.g. out of memory), the pool is rebuilt and the dates that were running
+    in it are retried. `on_success(fd, paths)` is called in this process as soon as a date
+    completes. Returns the (date, reason) pairs that failed for good.
+    """
+    failed: List[Tuple[str, str]] = []
+    attempts = {fd: 0 for fd in forecast_dates}
+    queue: List[Tuple[float, str]] = [(0.0, fd) for fd in forecast_dates]  # (not before, date)
+
+    def handle_error(fd: str, e: BaseException) -> None:
+        """Queue the next attempt with backoff, or give the date up."""
+        reason = f"{type(e).__name__}: {e}"
+        if attempts[fd] < max_retries:
+            delay = retry_backoff * 2 ** attempts[fd]
+            attempts[fd] += 1
+            print(f"[{fd}] FAILED — {reason} (retry {attempts[fd]}/{max_retries} in {delay:.0f}s)")
+            queue.append((time.monotonic() + delay, fd))
+        else:
+            failed.append((fd, reason))
+            print(f"[{fd}] ABORTED — {reason}")
+
+    def next_ready() -> Tuple[List[str], float | None]:
+        """Dates that may start now, and the seconds until the next queued date may start."""
+        now = time.monotonic()
+        ready = [fd for t, fd in queue if t <= now]
+        queue[:] = [(t, fd) for t, fd in queue if t > now]
+        return ready, min((t - now for t, _ in queue), default=None)
+
+    if date_jobs == 1:
+        while queue:
+            ready, wait_for = next_ready()
+            if not ready:
+                time.sleep(wait_for)
+            for fd in ready:
+                try:
+                    paths = forecast_date_job(fd, **job)
+                except Exception as e:
+                    handle_error(fd, e)
+                else:
+                    if on_success is not None:
+                        on_success(fd, paths)
+        return failed
+
+    n_cpus = os.cpu_count() or 1
+    n_workers = min(len(forecast_dates), n_cpus if date_jobs == -1 else date_jobs)
+    job = dict(job, n_cpus=max(1, n_cpus // n_workers))
+
+    def make_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_date_worker,
+            initargs=(job["n_cpus"],),
+        )
+
+    def collect(fut, fd: str) -> bool:
+        """Handle a finished date; return True if its worker pool is broken."""
+        try:
+            paths = fut.result()
+        except BrokenProcessPool as e:
+            handle_error(fd, e)
+            return True
+        except Exception as e:
+            handle_error(fd, e)
+        else:
+            if on_success is not None:
+                on_success(fd, paths)
+        return False
+
+    ex = make_pool()
+    pending = {}
+    try:
+        while queue or pending:
+            ready, wait_for = next_ready()
+            for fd in ready:
+                pending[ex.submit(forecast_date_job, fd, **job)] = fd
+            if not pending:
+                time.sleep(wait_for)
+                continue
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            broken = False
+            for fut in done:
+                broken |= collect(fut, pending.pop(fut))
+            if broken:
+                # the other dates of the dead pool fail with it: collect them, start a new pool
+                ex.shutdown(wait=True, cancel_futures=True)
+                for fut, fd in pending.items():
+                    collect(fut, fd)
+                pending = {}
+                ex = make_pool()
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+    return failed
+
+
 def generate_forecasts(
     model: ModelName,
     forecast_dates: Union[str, Sequence[str]] = FORECAST_DATES,
@@ -185,6 +856,16 @@ def generate_forecasts(
     data_mode: DataMode = "all",
     seeds=RANDOM_SEEDS,
     save_models: bool = False,
+    direct_quantiles: bool = False,
+    combine: Combine = "mixture",
+    n_jobs: int = 1,
+    date_jobs: int = 1,
+    resume: bool = True,
+    max_retries: int = 2,
+    retry_backoff: float = 30.0,
+    use_model_cache: bool = True,
+    warm_start: int = 0,
+    full_retrain_every: int = 4,
 ) -> None:
     """
     Train and generate forecasts for one or many forecast dates.
@@ -195,7 +876,12 @@ def generate_forecasts(
       - trains a fresh model per seed,
       - runs the selected modes (naive/coupling/discard/oracle),
       - aggregates across seeds per mode,
-      - exports one CSV per mode.
+      - exports one CSV per mode and records it in forecasts/manifest.jsonl.
+
+    Dates can run in parallel (`date_jobs`) and are retried with exponential backoff when they
+    fail. With `resume=True`, dates whose CSVs were already written with the same configuration
+    (model, data mode, parameters, seeds, prediction settings, content of the data files) are
+    skipped.
 
     Parameters
     ----------
@@ -211,6 +897,34 @@ def generate_forecasts(
         Random seeds for repeated training.
     save_models : bool, default=False
         If True, saves each trained model (clean=True) under ROOT/models/<date>/...
+    direct_quantiles : bool, default=False
+        If True, predict the quantile heads directly instead of drawing NUM_SAMPLES samples
+        (LightGBM only). Coupling/discard paths are then combined according to `combine`.
+    combine : {"mixture", "vincentization"}, default="mixture"
+        How per-path quantile forecasts are combined when `direct_quantiles` is True.
+    n_jobs : int, default=1
+        Number of worker processes the seeds are fitted in (-1: one per CPU). Each worker
+        is limited to its share of the CPU threads.
+    date_jobs : int, default=1
+        Number of forecast dates processed in parallel worker processes (-1: one per CPU).
+        Combined with `n_jobs`, up to `date_jobs * n_jobs` processes are used.
+    resume : bool, default=True
+        Skip dates recorded as complete in the manifest with a matching configuration hash.
+    max_retries : int, default=2
+        How often a failed date is retried before it is reported as failed.
+    retry_backoff : float, default=30.0
+        Seconds to wait before the first retry; doubled for every further retry.
+    use_model_cache : bool, default=True
+        Reuse fitted models from ROOT/models/cache, keyed by model, parameters, data mode,
+        training-data vintage and seed; models are only fitted on a miss. The cache is pruned
+        to MODEL_CACHE_MAX_BYTES (least recently used first) after every date.
+    warm_start : int, default=0
+        If > 0, continue training the previous date's model instead of fitting from scratch:
+        `warm_start` extra boosting rounds (LightGBM) or fine-tuning epochs (TSMixer).
+        Requires `use_model_cache`. See `warm_start_report` for the effect on time and WIS.
+    full_retrain_every : int, default=4
+        With `warm_start`, fit from scratch on every `full_retrain_every`-th date of
+        FORECAST_DATES to bound the drift of warm-started models.
     verbose : bool, default=True
         If True, prints the training configuration once.
 
@@ -229,6 +943,10 @@ def generate_forecasts(
         raise ValueError(f"Invalid mode(s): {modes!r}. Allowed values: {sorted(ALLOWED_MODES)}")
     if data_mode not in ALLOWED_DATA_MODES:
         raise ValueError(f"Invalid data_mode: {data_mode!r}. Allowed values: {sorted(ALLOWED_DATA_MODES)}")
+    if direct_quantiles and model != "lightgbm":
+        raise ValueError("direct_quantiles is only available for 'lightgbm' (quantile regression).")
+    if warm_start and not use_model_cache:
+        raise ValueError("warm_start requires use_model_cache=True (previous models are taken from the cache).")
 
     model_name = model if data_mode == "all" else f"{model}-{data_mode}"
     use_covariates, sample_weight = DATA_MODE_CONFIG[data_mode]
@@ -255,86 +973,71 @@ def generate_forecasts(
     if "oracle" in modes:
         complete_targets, _ = load_realtime_training_data()
 
-    failed: List[Tuple[str, str]] = []
+    job = dict(
+        model=model,
+        model_name=model_name,
+        modes=modes,
+        params=params,
+        use_covariates=use_covariates,
+        use_encoders=use_encoders,
+        sample_weight=sample_weight,
+        seeds=seeds,
+        complete_targets=complete_targets,
+        save_models=save_models,
+        predict_kwargs=dict(direct_quantiles=direct_quantiles, combine=combine),
+        data_mode=data_mode,
+        use_model_cache=use_model_cache,
+        warm_start=warm_start,
+        full_retrain_every=full_retrain_every,
+        n_jobs=n_jobs,
+    )
 
-    # ---- main loop: per date
-    for fd in forecast_dates:
-        print(f"→ {fd}")
-        try:
-            # Training data (complete up to fd) + weights
-            targets_train, covars_train = load_realtime_training_data(as_of=fd, drop_incomplete=True)
-            weights = exclude_covid_weights(targets_train) if sample_weight == "no-covid" else sample_weight
-
-            # As-of data (may include incomplete values)
-            targets_asof, covars_asof = load_realtime_training_data(as_of=fd, drop_incomplete=False)
-
-            # Nowcast per date for coupling/discard
-            ts_now = None
-            if any(m in ("coupling", "discard") for m in modes):
-                ts_now = load_nowcast(forecast_date=fd)
-
-            # Collect per-seed runs for each mode
-            per_mode_runs: Dict[Mode, List[pd.DataFrame]] = {m: [] for m in modes}
-
-            for seed in tqdm(seeds, desc=f"{fd}", leave=False):
-                mdl = fit_model(model, targets_train, covars_train, params, use_covariates, use_encoders, weights, seed)
-
-                if save_models:
-                    model_path = ROOT / "models" / fd / f"{fd}-{model_name}-{seed}.pkl"
-                    model_path.parent.mkdir(parents=True, exist_ok=True)
-                    mdl.save(str(model_path), clean=True)
-
-                covars_for_predict = None if not getattr(mdl, "uses_past_covariates", True) else covars_asof
-
-                if "naive" in modes:
-                    per_mode_runs["naive"].append(
-                        compute_forecast(
-                            mdl, targets=targets_asof, covariates=covars_for_predict, forecast_date=fd, mode="naive"
-                        )
-                    )
-                if "coupling" in modes:
-                    per_mode_runs["coupling"].append(
-                        compute_forecast(
-                            mdl,
-                            targets=targets_asof,
-                            covariates=covars_for_predict,
-                            ts_nowcast=ts_now,
-                            forecast_date=fd,
-                            mode="coupling",
-                        )
-                    )
-                if "discard" in modes:
-                    per_mode_runs["discard"].append(
-                        compute_forecast(
-                            mdl,
-                            targets=targets_asof,
-                            covariates=covars_for_predict,
-                            ts_nowcast=ts_now,
-                            forecast_date=fd,
-                            mode="discard",
-                        )
-                    )
-                if "oracle" in modes:
-                    per_mode_runs["oracle"].append(
-                        compute_forecast(
-                            mdl,
-                            complete_targets=complete_targets,
-                            covariates=covars_for_predict,
-                            forecast_date=fd,
-                            mode="oracle",
-                        )
-                    )
-
-            # Aggregate & export per mode
-            for m in modes:
-                df = aggregate_runs(per_mode_runs[m])
-                out_dir = ROOT / "forecasts" / f"{model_name}-{m}"
-                fname = f"{fd}-icosari-sari-{model_name}-{m}.csv"
-                save_csv(df, out_dir, fname)
+    # ---- resume: skip dates whose outputs were written with the same configuration
+    config_hash = stable_hash(
+        dict(
+            model=model,
+            data_mode=data_mode,
+            params=params,
+            use_encoders=use_encoders,
+            seeds=list(seeds),
+            num_samples=NUM_SAMPLES,
+            horizon=HORIZON,
+            quantiles=QUANTILES,
+            direct_quantiles=direct_quantiles,
+            combine=combine if direct_quantiles else None,
+            data=files_hash([f for indicator in ("sari", "are") for f in source_files(indicator)]),
+            **(dict(warm_start=warm_start, full_retrain_every=full_retrain_every) if warm_start else {}),
+        )
+    )
+    if resume:
+        manifest = read_manifest()
+        done = [fd for fd in forecast_dates if is_complete(manifest, model_name, modes, fd, config_hash)]
+        if done:
+            print(f"Skipping {len(done)} date(s) already completed with this configuration.")
+        forecast_dates = [fd for fd in forecast_dates if fd not in done]
 
-        except Exception as e:
-            failed.append((fd, f"{type(e).__name__}: {e}"))
-            print(f"[{fd}] ABORTED — {type(e).__name__}: {e}")
+    def record(fd: str, paths: Dict[Mode, Path]) -> None:
+        append_manifest(
+            dict(
+                model_name=model_name,
+                mode=m,
+                forecast_date=fd,
+                config_hash=config_hash,
+                path=str(path.relative_to(ROOT)),
+            )
+            for m, path in paths.items()
+        )
+        if use_model_cache:
+            evict_models()
+
+    failed = run_date_jobs(
+        forecast_dates,
+        job,
+        date_jobs=date_jobs,
+        max_retries=max_retries,
+        retry_backoff=retry_backoff,
+        on_success=record,
+    )
 
     if failed:
         print("\nCompleted with errors — the following dates failed:")
@@ -342,3 +1045,87 @@ def generate_forecasts(
             print(f"  {d}: {reason}")
     else:
         print("\nAll dates completed successfully.")
+
+
+def warm_start_report(
+    model: ModelName,
+    forecast_dates: Sequence[str] = FORECAST_DATES,
+    *,
+    data_mode: DataMode = "all",
+    warm_start: int = 50,
+    full_retrain_every: int = 4,
+    seed: int = RANDOM_SEEDS[0],
+) -> pd.DataFrame:
+    """
+    Compare warm-started training against full retraining on `forecast_dates`.
+
+    For every date both variants are fitted (bypassing the model cache), forecast in 'naive' mode
+    and scored against the final target data. The warm chain follows `model_spec`: it restarts on
+    every `full_retrain_every`-th date of FORECAST_DATES (where the full fit is reused as the warm
+    model) and otherwise continues from the preceding date of FORECAST_DATES, which is also fitted
+    if it is not among `forecast_dates`. Returns one row per date with fit times in seconds and the
+    WIS of both variants.
+    """
+    use_covariates, sample_weight = DATA_MODE_CONFIG[data_mode]
+    params = get_best_parameters(model, use_covariates=use_covariates, sample_weight=sample_weight, clean=True)
+    use_encoders = params.pop("use_encoders", False)
+
+    # dates to fit, in chain order: each requested date back to the restart of its chain
+    def position(fd):
+        return FORECAST_DATES.index(fd) if fd in FORECAST_DATES else 0  # as in model_spec
+
+    chains = {}
+    for fd in forecast_dates:
+        i = position(fd)
+        chain = FORECAST_DATES[i - i % full_retrain_every : i] if fd in FORECAST_DATES else []
+        chains.setdefault(fd, chain + [fd])
+    schedule = list(dict.fromkeys(d for fd in sorted(chains, key=position) for d in chains[fd]))
+
+    rows, warm_model = {}, None
+    for fd in tqdm(schedule, desc="warm start"):
+        report = fd in chains
+        restart = position(fd) % full_retrain_every == 0
+        targets, covariates, weights = load_training_data(fd, sample_weight)
+        fit_args = (targets, covariates, params, use_covariates, use_encoders, weights, seed)
+
+        full_model, seconds_full = None, 0.0
+        if report or restart:
+            t0 = time.perf_counter()
+            full_model = fit_model(model, *fit_args)
+            seconds_full = time.perf_counter() - t0
+        if restart:
+            warm_model, seconds_warm = full_model, seconds_full  # the warm chain starts from the full fit
+        else:
+            t0 = time.perf_counter()
+            warm_model = fit_model(model, *fit_args, init_model=warm_model, warm_start=warm_start)
+            seconds_warm = time.perf_counter() - t0
+        if not report:
+            continue
+
+        targets_asof, covars_asof = load_realtime_training_data(as_of=fd, drop_incomplete=False)
+        dfs = []
+        for name, mdl in [("full", full_model), ("warm", warm_model)]:
+            df = compute_forecast(
+                mdl,
+                targets=targets_asof,
+                covariates=covars_asof if getattr(mdl, "uses_past_covariates", True) else None,
+                forecast_date=fd,
+            )
+            df["model"] = name
+            dfs.append(df)
+        df = pd.concat(dfs, ignore_index=True)
+        # dtypes as in the exported CSVs
+        df["target_end_date"] = df["target_end_date"].dt.strftime("%Y-%m-%d")
+        df["quantile"] = df["quantile"].astype(float)
+        wis = compute_wis(add_truth(df, target=True)).set_index("model")["wis"]
+
+        rows[fd] = dict(
+            forecast_date=fd,
+            full_retrain=restart,
+            fit_seconds_full=seconds_full,
+            fit_seconds_warm=seconds_warm,
+            wis_full=wis["full"],
+            wis_warm=wis["warm"],
+        )
+
+    return pd.DataFrame([rows[fd] for fd in dict.fromkeys(forecast_dates)])
@@ -1,10 +1,14 @@
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from darts.dataprocessing.transformers import StaticCovariatesTransformer
 from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
 
-from config import MODEL_NAMES, QUANTILES, ROOT
+from config import AGE_GROUPS, FORECAST_TYPES, LOCATIONS, MODEL_NAMES, QUANTILES, ROOT
+from src.columnar import read_table
+from src.forecast_archive import read_forecasts, scan_forecasts
 
 # Explicit mapping from Darts rounded quantile labels to our desired values
 Q_MAP = {
@@ -18,63 +22,86 @@ Q_MAP = {
 }
 
 
+def split_strata(strata):
+    """
+    Splits a stratum ('DE', 'DE-BY', '00-04', ...) into (location, age_group).
+    """
+    if any(char.isdigit() for char in strata):
+        return "DE", strata
+    return strata, "00+"
+
+
 def extract_info(row):
     """
     Splits the info of the 'strata' column into 'location' and 'age_group'.
     """
-    if any(char.isdigit() for char in row["strata"]):
-        location = "DE"
-        age_group = row["strata"]
-    else:
-        location = row["strata"]
-        age_group = "00+"
-    return pd.Series([location, age_group])
+    return pd.Series(split_strata(row["strata"]))
 
 
-def reshape_forecast(ts_forecast, nowcast=False, deterministic=False):
+@lru_cache(maxsize=64)
+def component_table(components):
     """
-    Transforms a forecast from TimeSeries format to Hub format.
+    Lookup table for a tuple of component names like 'icosari-sari-DE' or 'icosari-sari-00-04_q0.03':
+    arrays of location, age group and quantile label (None without a quantile suffix) per component.
+    """
+    source, indicator = components[0].split("-")[:2]
+    prefix = f"{source}-{indicator}-"
+
+    locations, age_groups, quantiles = [], [], []
+    for component in components:
+        strata, _, suffix = component.replace(prefix, "").partition("_")
+        location, age_group = split_strata(strata)
+        locations.append(location)
+        age_groups.append(age_group)
+        quantiles.append(Q_MAP.get(suffix))
+
+    return np.array(locations, dtype=object), np.array(age_groups, dtype=object), np.array(quantiles, dtype=object)
+
+
+def reshape_forecast(ts_forecast, nowcast=False, deterministic=False, quantile_components=False):
     """
+    Transforms a forecast from TimeSeries format to Hub format.
 
+    With `quantile_components=True`, `ts_forecast` already holds one component per quantile
+    level (e.g. from `predict_likelihood_parameters=True`) instead of samples.
+    """
     if deterministic:
-        df_temp = ts_forecast.pd_dataframe().reset_index().melt(id_vars="date")
+        ts_values = ts_forecast
     else:
-        df_temp = ts_forecast.quantile(q=QUANTILES).to_dataframe()
-        df_temp = df_temp.reset_index().melt(id_vars="date", var_name="component")
-        df_temp["quantile"] = df_temp["component"].str.rsplit("_", n=1).str[-1].map(Q_MAP)
+        ts_values = ts_forecast if quantile_components else ts_forecast.quantile(q=QUANTILES)
 
-    source = ts_forecast.components[0].split("-")[0]
-    indicator = ts_forecast.components[0].split("-")[1]
+    dates = ts_values.time_index.to_numpy()
+    values = ts_values.values(copy=False)  # (time × component)
+    n_dates, n_components = values.shape
+    locations, age_groups, quantiles = component_table(tuple(ts_values.components))
 
-    df_temp["strata"] = df_temp.component.apply(lambda x: x.replace(f"{source}-{indicator}-", "").split("_")[0])
-    df_temp[["location", "age_group"]] = df_temp.apply(extract_info, axis=1)
-
-    df_temp["horizon"] = df_temp.date.rank(method="dense").astype(int)
+    # rows are ordered by component, then date
+    horizon = np.arange(1, n_dates + 1)
     if nowcast:
-        df_temp.horizon = df_temp.horizon - df_temp.horizon.max()
-        df_temp["forecast_date"] = df_temp.date.max() + pd.Timedelta(days=4)
+        horizon = horizon - n_dates
+        forecast_date = dates.max() + pd.Timedelta(days=4)
     else:
-        df_temp["forecast_date"] = df_temp.date.min() - pd.Timedelta(days=3)
+        forecast_date = dates.min() - pd.Timedelta(days=3)
 
-    if deterministic:
-        df_temp = df_temp.loc[df_temp.index.repeat(len(QUANTILES))].reset_index(drop=True)
-        df_temp["quantile"] = pd.Series(QUANTILES * len(df_temp)).astype("str")
-
-    df_temp["type"] = "quantile"
-    df_temp = df_temp.rename(columns={"date": "target_end_date"})
-
-    return df_temp[
-        [
-            "location",
-            "age_group",
-            "forecast_date",
-            "target_end_date",
-            "horizon",
-            "type",
-            "quantile",
-            "value",
-        ]
-    ]
+    if deterministic:  # repeat each row once per quantile level
+        n_rep = len(QUANTILES)
+        quantile = np.tile(np.array([str(q) for q in QUANTILES], dtype=object), n_dates * n_components)
+    else:
+        n_rep = 1
+        quantile = np.repeat(quantiles, n_dates)
+
+    return pd.DataFrame(
+        {
+            "location": np.repeat(locations, n_dates * n_rep),
+            "age_group": np.repeat(age_groups, n_dates * n_rep),
+            "forecast_date": np.full(n_dates * n_components * n_rep, forecast_date),
+            "target_end_date": np.repeat(np.tile(dates, n_components), n_rep),
+            "horizon": np.repeat(np.tile(horizon, n_components), n_rep),
+            "type": "quantile",
+            "quantile": quantile,
+            "value": np.repeat(values.T.ravel(), n_rep),
+        }
+    )
 
 
 def filter_by_level(df, level):
@@ -90,16 +117,23 @@ def filter_by_level(df, level):
 def add_median(df):
     df_median = df[df["quantile"] == 0.5].copy()
     df_median["type"] = "median"
+    if isinstance(df["type"].dtype, pd.CategoricalDtype):
+        df_median["type"] = df_median["type"].astype(df["type"].dtype)
     return pd.concat([df, df_median], ignore_index=True)
 
 
 def add_truth(df, source="icosari", disease="sari", target=False):
+    # match the key dtypes of `df` (e.g. the compact schema) so that the merge keeps them
+    parse_dates = ["date"] if pd.api.types.is_datetime64_any_dtype(df["target_end_date"]) else None
     if target:
-        df_truth = pd.read_csv(ROOT / f"data/target-{source}-{disease}.csv")
+        df_truth = read_table(ROOT / f"data/target-{source}-{disease}.csv", parse_dates=parse_dates)
     else:
-        df_truth = pd.read_csv(ROOT / f"data/latest_data-{source}-{disease}.csv")
+        df_truth = read_table(ROOT / f"data/latest_data-{source}-{disease}.csv", parse_dates=parse_dates)
 
     df_truth = df_truth.rename(columns={"value": "truth"})
+    for col in ["location", "age_group"]:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df_truth[col] = df_truth[col].astype(df[col].dtype)
 
     df = df.merge(
         df_truth,
@@ -110,6 +144,48 @@ def add_truth(df, source="icosari", disease="sari", target=False):
     return df
 
 
+def compact_schema(df):
+    """
+    Compact in-memory schema for long-format forecast frames: location, age_group, type, model
+    and quantile become categoricals with the fixed category sets from config (values outside
+    them are appended), dates become datetime64, horizon int8 and value float32.
+
+    Frames compacted this way keep their categoricals when concatenated.
+    """
+    df = df.copy(deep=False)
+    categories = {
+        "location": LOCATIONS,
+        "age_group": AGE_GROUPS,
+        "type": FORECAST_TYPES,
+        "model": list(dict.fromkeys(MODEL_NAMES.values())),
+        "quantile": QUANTILES,
+    }
+    for col, cats in categories.items():
+        if col in df.columns:
+            extra = sorted(set(df[col].dropna().unique()) - set(cats))
+            df[col] = pd.Categorical(df[col], categories=[*cats, *extra])
+    for col in ("forecast_date", "target_end_date", "date"):
+        if col in df.columns:
+            df[col] = df[col].astype("datetime64[ns]")  # to_datetime may keep a categorical
+    if "horizon" in df.columns:
+        df["horizon"] = df["horizon"].astype(np.int8)
+    if "value" in df.columns:
+        df["value"] = df["value"].astype(np.float32)
+    return df
+
+
+def select_forecast_files(models=None, start="2023-11-16", end="2024-09-12", exclude_christmas=True):
+    """Forecast files (see `scan_forecasts`) of `models` (display names) in the date range; only file metadata is read."""
+    files = scan_forecasts()
+    files["model"] = files.model.map(lambda m: MODEL_NAMES.get(m, m))
+    if models is None:
+        models = MODEL_NAMES.values()
+    keep = files.model.isin(models) & files.forecast_date.between(start, end)
+    if exclude_christmas:
+        keep &= files.forecast_date != "2023-12-28"
+    return files[keep].reset_index(drop=True)
+
+
 def load_predictions(
     models=None,
     start="2023-11-16",
@@ -118,29 +194,21 @@ def load_predictions(
     include_median=True,
     include_truth=True,
     target=True,
+    n_jobs=None,
+    use_cache=True,
+    compact=False,
 ):
-    path_forecasts = ROOT / "forecasts"
-    files = [p for p in path_forecasts.rglob("*.csv") if ".ipynb_checkpoints" not in p.parts]
-
-    df = pd.concat(
-        (pd.read_csv(f).assign(model=f.stem.split("-", 5)[-1]) for f in files),
-        ignore_index=True,
-    )
+    files = select_forecast_files(models, start, end, exclude_christmas)
+    df = read_forecasts(files, n_jobs=n_jobs, use_cache=use_cache, categorical=compact)
+    if compact:
+        df = compact_schema(df)
 
     if include_median:
         df = add_median(df)
     if include_truth:
         df = add_truth(df, source="icosari", disease="sari", target=target)
-    if exclude_christmas:
-        df = df[df.forecast_date != "2023-12-28"]
 
-    df.model = df.model.replace(MODEL_NAMES)
-
-    if models is None:
-        models = MODEL_NAMES.values()
-    df = df[df.model.isin(models)]
-
-    return df[df.forecast_date.between(start, end)].reset_index(drop=True)
+    return df.reset_index(drop=True)
 
 
 def load_nowcasts(
@@ -149,6 +217,7 @@ def load_nowcasts(
     include_truth=True,
     exclude_christmas=True,
     quantiles=None,
+    compact=False,
 ):
     path_nowcasts = Path.cwd().parent / "nowcasts" / "simple_nowcast"
     files = [p for p in path_nowcasts.rglob("*.csv") if ".ipynb_checkpoints" not in p.parts]
@@ -169,7 +238,7 @@ def load_nowcasts(
     if quantiles is not None:
         df = df[df["quantile"].isin(quantiles)]
 
-    return df
+    return compact_schema(df) if compact else df
 
 
 def encode_static_covariates(ts, ordinal=False):
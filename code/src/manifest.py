@@ -0,0 +1,47 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from config import ROOT
+
+MANIFEST_PATH = ROOT / "forecasts" / "manifest.jsonl"
+
+Key = Tuple[str, str, str]  # (model_name, mode, forecast_date)
+
+
+def read_manifest(path: Path = MANIFEST_PATH) -> Dict[Key, dict]:
+    """Return the latest manifest entry per (model_name, mode, forecast_date)."""
+    entries: Dict[Key, dict] = {}
+    if not path.exists():
+        return entries
+
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # partially written line from an interrupted run
+            entries[(entry["model_name"], entry["mode"], entry["forecast_date"])] = entry
+    return entries
+
+
+def append_manifest(entries: Iterable[dict], path: Path = MANIFEST_PATH) -> None:
+    """Append completed outputs; one JSON object per line, flushed to disk immediately."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    now = datetime.now().isoformat(timespec="seconds")
+    with open(path, "a") as f:
+        for entry in entries:
+            f.write(json.dumps({**entry, "completed_at": now}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def is_complete(manifest: Dict[Key, dict], model_name: str, modes, forecast_date: str, config_hash: str) -> bool:
+    """True if every mode of this date was written with `config_hash` and its CSV still exists."""
+    for mode in modes:
+        entry = manifest.get((model_name, mode, forecast_date))
+        if entry is None or entry["config_hash"] != config_hash or not (ROOT / entry["path"]).exists():
+            return False
+    return True
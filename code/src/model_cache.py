@@ -0,0 +1,97 @@
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import darts
+from darts.models import LightGBMModel, TSMixerModel
+
+from config import ENCODERS, HORIZON, MODEL_CACHE_DIR, MODEL_CACHE_MAX_BYTES, QUANTILES, SHARED_ARGS, ModelName
+from src.cache import stable_hash
+
+
+def model_key(
+    model: ModelName, params: dict, data_mode: str, vintage: str, seed: int, warm_start: dict | None = None
+) -> str:
+    """
+    Cache key of a fitted model: everything that determines the result of `fit_model`, including
+    the model settings from config (quantiles, horizon, encoders, TSMixer's shared arguments) and
+    the darts version.
+
+    `warm_start` describes the model training was continued from (see `forecasting.model_spec`).
+    """
+    key = dict(
+        model=model,
+        params=params,
+        data_mode=data_mode,
+        vintage=vintage,
+        seed=seed,
+        config=dict(quantiles=QUANTILES, horizon=HORIZON, encoders=ENCODERS, shared_args=SHARED_ARGS),
+        darts=darts.__version__,
+    )
+    if warm_start is not None:
+        key["warm_start"] = warm_start
+    return stable_hash(key)
+
+
+def _entry_dir(key: str) -> Path:
+    return MODEL_CACHE_DIR / key
+
+
+def load_cached_model(model: ModelName, key: str):
+    """Return the cached fitted model for `key`, or None on a miss."""
+    entry = _entry_dir(key)
+    if not (entry / "model.pkl").exists():
+        return None
+    try:
+        if model == "tsmixer":  # the trainer settings are not restored from the checkpoint
+            mdl = TSMixerModel.load(str(entry / "model.pkl"), pl_trainer_kwargs=SHARED_ARGS["pl_trainer_kwargs"])
+        else:
+            mdl = LightGBMModel.load(str(entry / "model.pkl"))
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    os.utime(entry)  # mark as recently used
+    return mdl
+
+
+def save_cached_model(mdl, key: str) -> None:
+    """Save a fitted model under `key`; written to a temporary directory and renamed into place."""
+    entry = _entry_dir(key)
+    if entry.exists():
+        return
+
+    tmp = MODEL_CACHE_DIR / f".{key}.{os.getpid()}.tmp"
+    tmp.mkdir(parents=True, exist_ok=True)
+    mdl.save(str(tmp / "model.pkl"), clean=True)  # torch models also write a model.pkl.ckpt
+    try:
+        os.rename(tmp, entry)
+    except OSError:  # saved concurrently by another worker
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+
+
+def evict_models(max_bytes: int = MODEL_CACHE_MAX_BYTES) -> int:
+    """Delete the least recently used models until the cache fits into `max_bytes`; returns the number removed."""
+    if not MODEL_CACHE_DIR.exists():
+        return 0
+
+    entries = []
+    for entry in MODEL_CACHE_DIR.iterdir():
+        if entry.is_dir() and not entry.name.startswith("."):
+            try:
+                entries.append((entry.stat().st_mtime, _dir_size(entry), entry))
+            except OSError:
+                continue
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
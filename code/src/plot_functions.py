@@ -1,22 +1,28 @@
+import numpy as np
 import pandas as pd
 
-from src.load_data import extract_info
+from src.load_data import component_table
 
 
 def reshape_truth(y):
     """
     Reformat timeseries so prediciton bands can start at the last known value at each forecast date.
     """
-    source = y.components[0].split("-")[0]
-    indicator = y.components[0].split("-")[1]
-
-    y = y.to_dataframe()
-    y = y.reset_index().melt(id_vars="date", var_name="component")
-
-    # y['strata']   = y.component.apply(lambda x: x.split('-', 2)[-1].split('_')[0])
-    y["strata"] = y.component.apply(lambda x: x.replace(f"{source}-{indicator}-", "").split("_")[0])
-    y[["location", "age_group"]] = y.apply(extract_info, axis=1)
+    dates = y.time_index.to_numpy()
+    values = y.values(copy=False)  # (time × component)
+    n_dates, n_components = values.shape
+    locations, age_groups, _ = component_table(tuple(y.components))
 
+    # rows are ordered by component, then date
+    target_end_date = np.tile(dates, n_components)
+    value = values.T.ravel()
+    y = pd.DataFrame(
+        {
+            "target_end_date": target_end_date,
+            "location": np.repeat(locations, n_dates),
+            "age_group": np.repeat(age_groups, n_dates),
+        }
+    )
     for q in [
         "quantile_0.025",
         "quantile_0.25",
@@ -24,13 +30,11 @@ def reshape_truth(y):
         "quantile_0.75",
         "quantile_0.975",
     ]:
-        y[q] = y.value
+        y[q] = value
 
     y["type"] = "truth"
     y["horizon"] = 0
-    y = y.rename(columns={"date": "target_end_date"})
     y["forecast_date"] = y.target_end_date + pd.Timedelta(days=4)
-    y = y.drop(columns=["component", "strata", "value"])
 
     return y
 
@@ -1,15 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
 from darts import TimeSeries, concatenate
 from darts.utils.ts_utils import retain_period_common_to_all
 
-from config import ROOT, SOURCE_DICT
+from config import FORECAST_DATES, ROOT, SOURCE_DICT
+from src.cache import cache_path, file_hash, files_hash, read_pickle, stable_hash, write_pickle
+from src.columnar import read_table
+from src.load_data import encode_static_covariates
 
 
 def load_latest_series(indicator="sari"):
     source = SOURCE_DICT[indicator]
 
-    ts = pd.read_csv(ROOT / f"data/latest_data-{source}-{indicator}.csv")
+    ts = read_table(ROOT / f"data/latest_data-{source}-{indicator}.csv")
 
     ts = ts[ts.location == "DE"]
 
@@ -35,10 +42,9 @@ def load_target_series(indicator="sari", as_of=None, age_group=None):
     source = SOURCE_DICT[indicator]
 
     if as_of is None:
-        target = pd.read_csv(ROOT / f"data/target-{source}-{indicator}.csv")
+        target = read_table(ROOT / f"data/target-{source}-{indicator}.csv")
     else:
-        rt = load_rt(indicator)
-        target = target_as_of(rt, as_of)
+        target = load_triangle(indicator).as_of(as_of)
 
     target = target[target.location == "DE"]
 
@@ -67,59 +73,95 @@ def load_target_series(indicator="sari", as_of=None, age_group=None):
     return ts_target
 
 
-def load_nowcast(
-    forecast_date,
-    probabilistic=True,
-    indicator="sari",
-    local=True,
-    model="simple_nowcast",
-):
+def _nowcast_path(forecast_date, indicator, local, model):
     source = SOURCE_DICT[indicator]
 
     if local:
-        filepath = (
+        return (
             ROOT
             / f"{f'nowcasts/{model}' if indicator == 'sari' else '../ari/nowcasts'}/{forecast_date}-{source}-{indicator}-{model}.csv"
         )
-    else:
-        filepath = f"https://raw.githubusercontent.com/KITmetricslab/RESPINOW-Hub/refs/heads/main/submissions/{source}/{indicator}/KIT-{model}/{forecast_date}-{source}-{indicator}-KIT-{model}.csv"
-    df = pd.read_csv(filepath)
+    return f"https://raw.githubusercontent.com/KITmetricslab/RESPINOW-Hub/refs/heads/main/submissions/{source}/{indicator}/KIT-{model}/{forecast_date}-{source}-{indicator}-KIT-{model}.csv"
+
+
+def _read_nowcast(filepath, probabilistic=True):
+    df = pd.read_csv(
+        filepath, usecols=["location", "age_group", "target_end_date", "horizon", "type", "quantile", "value"]
+    )
     df = df[(df.location == "DE") & (df.type == "quantile") & (df.horizon >= -3)]
-    df = df.rename(columns={"target_end_date": "date"})
-    df = df.sort_values(["location", "age_group"], ignore_index=True)
 
     if not probabilistic:
         df = df[df["quantile"] == 0.5]
 
-    all_nowcasts = []
-    for age in df.age_group.unique():
-        # print(age)
-        df_temp = df[df.age_group == age]
-
-        # transform nowcast into a TimeSeries object
-        nowcast_age = TimeSeries.from_group_dataframe(
-            df_temp,
-            group_cols=["age_group", "quantile"],
-            time_col="date",
-            value_cols="value",
-            freq="7D",
-            fillna_value=0,
-        )
+    return df
+
+
+def nowcast_to_series(df, indicator="sari"):
+    """
+    Pivot a Hub-format nowcast into a single TimeSeries of shape (time × age group × quantile).
+
+    Each quantile level becomes one sample; missing cells are filled with 0.
+    """
+    source = SOURCE_DICT[indicator]
+
+    ages = np.sort(df.age_group.unique())
+    quantiles = np.sort(df["quantile"].unique())
+    dates = pd.to_datetime(df.target_end_date)
+    times = pd.date_range(dates.min(), dates.max(), freq="7D", name="date")
+
+    values = np.zeros((len(times), len(ages), len(quantiles)))
+    values[
+        times.get_indexer(dates),
+        ages.searchsorted(df.age_group.to_numpy()),
+        quantiles.searchsorted(df["quantile"].to_numpy()),
+    ] = df["value"].to_numpy()
+
+    components = [f"{source}-{indicator}-" + ("DE" if age == "00+" else age) for age in ages]
+
+    return TimeSeries.from_times_and_values(
+        times=times,
+        values=values,
+        columns=components,
+        static_covariates=pd.DataFrame({"age_group": ages}, index=components),
+    )
 
-        nowcast_age = concatenate(nowcast_age, axis="sample")
-        nowcast_age.static_covariates.drop(columns=["quantile"], inplace=True, errors="ignore")
-        nowcast_age = nowcast_age.with_columns_renamed(nowcast_age.components, [f"{source}-{indicator}-" + age])
 
-        all_nowcasts.append(nowcast_age)
+def load_nowcast(
+    forecast_date,
+    probabilistic=True,
+    indicator="sari",
+    local=True,
+    model="simple_nowcast",
+):
+    filepath = _nowcast_path(forecast_date, indicator, local, model)
+    return nowcast_to_series(_read_nowcast(filepath, probabilistic), indicator)
 
-    all_nowcasts = concatenate(all_nowcasts, axis="component")
-    all_nowcasts = all_nowcasts.with_columns_renamed(f"{source}-{indicator}-00+", f"{source}-{indicator}-DE")
 
-    return all_nowcasts
+def load_nowcast_batch(
+    forecast_dates,
+    probabilistic=True,
+    indicator="sari",
+    local=True,
+    model="simple_nowcast",
+    max_workers=8,
+):
+    """Load the nowcasts for many forecast dates at once; returns {forecast_date: TimeSeries}."""
+    paths = [_nowcast_path(fd, indicator, local, model) for fd in forecast_dates]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        frames = ex.map(lambda p: _read_nowcast(p, probabilistic), paths)
+        return {fd: nowcast_to_series(df, indicator) for fd, df in zip(forecast_dates, frames)}
 
 
-def make_target_paths(target_series, nowcast):
-    """Cut known truth series and append nowcasted values."""
+def make_target_paths(target_series, nowcast, encode=False):
+    """
+    Cut known truth series and append nowcasted values.
+
+    Returns one multivariate series per nowcast sample (quantile level). All paths share one
+    (path × time × component) buffer: the known history is written once and broadcast, the nowcast
+    samples fill the tail, and each series wraps its slice without copying. With `encode=True`, the
+    static covariates are one-hot encoded once and attached to every path.
+    """
 
     # Only cut if nowcast.start_time is within the target_series
     if nowcast.start_time() <= target_series.end_time():
@@ -127,48 +169,150 @@ def make_target_paths(target_series, nowcast):
     else:
         target_temp = target_series
 
-    # every entry is a multivariate timeseries (one sample path for each age group)
-    # there is one entry per quantile level
-    target_list = [
-        concatenate(
-            [target_temp[age].append_values(nowcast[age].univariate_values(sample=i)) for age in nowcast.components],
-            axis="component",
+    components = list(nowcast.components)
+    history = target_temp[components]
+    n_history = len(history)
+
+    times = pd.date_range(
+        history.start_time(), periods=n_history + len(nowcast), freq=history.freq, name=history.time_index.name
+    )
+
+    paths = np.empty((nowcast.n_samples, len(times), len(components)))
+    paths[:, :n_history] = history.values(copy=False)
+    paths[:, n_history:] = np.moveaxis(nowcast.all_values(copy=False), -1, 0)
+
+    static_covariates = history.static_covariates
+    if encode:
+        static_covariates = encode_static_covariates(history, ordinal=False).static_covariates
+
+    return [
+        TimeSeries.from_times_and_values(
+            times, path, columns=components, static_covariates=static_covariates, copy=False
         )
-        for i in range(nowcast.n_samples)
+        for path in paths
     ]
 
-    return target_list
+
+def rt_path(indicator="sari", preprocessed=False):
+    source = SOURCE_DICT[indicator]
+    return ROOT / f"data/reporting_triangle-{source}-{indicator}{'-preprocessed' if preprocessed else ''}.csv"
 
 
 def load_rt(indicator="sari", preprocessed=False):
     """Load reporting triangle for a given indicator."""
-    source = SOURCE_DICT[indicator]
-    rt = pd.read_csv(
-        ROOT / f"data/reporting_triangle-{source}-{indicator}{'-preprocessed' if preprocessed else ''}.csv",
-        parse_dates=["date"],
-    )
+    rt = read_table(rt_path(indicator, preprocessed), parse_dates=["date"])
 
     return rt.loc[:, :"value_4w"]
 
 
-def set_last_n_values_to_nan(group):
-    for i in [1, 2, 3, 4]:  # Loop for value_1w, value_2w, ..., value_4w
-        group.loc[group.index[-i:], f"value_{i}w"] = np.nan
-    return group
+DELAY_COLUMNS = ["value_0w", "value_1w", "value_2w", "value_3w", "value_4w"]
 
 
-def target_as_of(rt, date):
-    """Return the target time series as it would have been known on the specified date."""
-    date = pd.Timestamp(date)
-    rt_temp = rt[rt.date <= date]
+@dataclass(frozen=True)
+class ReportingTriangle:
+    """
+    Dense (stratum × date × delay) representation of a reporting triangle.
 
-    # in column 'value_1w' the last entry is set to nan, in column 'value_2w' the last two entries, etc.
-    rt_temp = (
-        rt_temp.groupby(["location", "age_group"]).apply(set_last_n_values_to_nan, include_groups=False).reset_index()
-    )
-    rt_temp["value"] = rt_temp[["value_0w", "value_1w", "value_2w", "value_3w", "value_4w"]].sum(axis=1).astype(int)
+    Strata are the (location, age_group) pairs in sorted order, dates the sorted union of all
+    reporting dates. Cells without a row in the source table are NaN and flagged in `observed`.
+    """
+
+    strata: pd.MultiIndex
+    dates: pd.DatetimeIndex
+    year: np.ndarray  # (date,)
+    week: np.ndarray  # (date,)
+    values: np.ndarray  # (stratum, date, delay)
+    observed: np.ndarray  # (stratum, date)
+
+    @classmethod
+    def from_frame(cls, rt):
+        strata = pd.MultiIndex.from_frame(
+            rt[["location", "age_group"]].drop_duplicates().sort_values(["location", "age_group"])
+        )
+        dates = pd.DatetimeIndex(rt["date"].drop_duplicates().sort_values())
+
+        i = strata.get_indexer(pd.MultiIndex.from_frame(rt[["location", "age_group"]]))
+        j = dates.get_indexer(rt["date"])
+
+        values = np.full((len(strata), len(dates), len(DELAY_COLUMNS)), np.nan)
+        values[i, j] = rt[DELAY_COLUMNS].to_numpy(dtype=float)
+        observed = np.zeros((len(strata), len(dates)), dtype=bool)
+        observed[i, j] = True
+
+        calendar = rt.drop_duplicates("date").set_index("date").loc[dates]
+
+        return cls(
+            strata=strata,
+            dates=dates,
+            year=calendar["year"].to_numpy(),
+            week=calendar["week"].to_numpy(),
+            values=values,
+            observed=observed,
+        )
+
+    def _cutoffs(self, as_of):
+        """Number of dates known on each as_of date."""
+        return self.dates.searchsorted(pd.DatetimeIndex(as_of), side="right")
+
+    def vintages(self, as_of=FORECAST_DATES):
+        """
+        Values as they were known on each date in `as_of`, shape (vintage, stratum, date).
+
+        For every stratum, the last k rows known at a vintage are missing the delays >= k,
+        i.e. 'value_1w' is masked in the last row, 'value_2w' in the last two rows, etc.
+        Cells after the vintage date or without a report are NaN.
+        """
+        as_of = pd.DatetimeIndex(pd.to_datetime(np.atleast_1d(as_of)))
+        cutoffs = self._cutoffs(as_of)
+
+        # number of observed rows at or after each date, padded so that index len(dates) is zero
+        remaining = np.cumsum(self.observed[:, ::-1], axis=1)[:, ::-1]
+        remaining = np.pad(remaining, ((0, 0), (0, 1)))
+
+        # position from the end among the rows known at each vintage (1 = last known row)
+        position = remaining[None, :, :-1] - remaining[:, cutoffs].T[:, :, None]
+        known = self.observed[None] & (np.arange(len(self.dates)) < cutoffs[:, None, None])
+
+        delays = np.arange(len(DELAY_COLUMNS))
+        reported = position[..., None] > delays
+        values = np.nansum(np.where(reported, self.values[None], np.nan), axis=-1)
+
+        return np.where(known, values, np.nan)
+
+    def as_of(self, date):
+        """Return the target in long format as it would have been known on the specified date."""
+        values = self.vintages([date])[0]
+        s, t = np.nonzero(~np.isnan(values))
+
+        return pd.DataFrame(
+            {
+                "location": self.strata.get_level_values("location")[s],
+                "age_group": self.strata.get_level_values("age_group")[s],
+                "year": self.year[t],
+                "week": self.week[t],
+                "date": self.dates[t],
+                "value": values[s, t].astype(int),
+            }
+        )
+
+
+@lru_cache(maxsize=8)
+def _load_triangle(indicator, preprocessed, digest):
+    return ReportingTriangle.from_frame(load_rt(indicator, preprocessed))
 
-    return rt_temp[["location", "age_group", "year", "week", "date", "value"]]
+
+def load_triangle(indicator="sari", preprocessed=False):
+    """
+    Load the reporting triangle as a ReportingTriangle, once per process and content of the CSV
+    (an edited file is reloaded, also in a running kernel or worker).
+    """
+    return _load_triangle(indicator, preprocessed, file_hash(rt_path(indicator, preprocessed)))
+
+
+def target_as_of(rt, date):
+    """Return the target time series as it would have been known on the specified date."""
+    triangle = rt if isinstance(rt, ReportingTriangle) else ReportingTriangle.from_frame(rt)
+    return triangle.as_of(date)
 
 
 def get_preceding_thursday(date):
@@ -177,21 +321,62 @@ def get_preceding_thursday(date):
     return date - pd.Timedelta(days=(date.weekday() - 3) % 7)  # weekday of Thursday is 3
 
 
-def load_realtime_training_data(as_of=None, drop_incomplete=True):
-    # load sari data
-    target_sari = load_target_series("sari", as_of)
-    latest_sari = load_latest_series("sari")
+def source_files(indicator="sari"):
+    """Data files the (as-of) series of an indicator are built from."""
+    source = SOURCE_DICT[indicator]
+    return [ROOT / f"data/{name}-{source}-{indicator}.csv" for name in ("latest_data", "target", "reporting_triangle")]
+
+
+def build_realtime_series(indicator="sari", as_of=None):
+    """Latest data up to the start of the target period, followed by the target as known on `as_of`."""
+    target = load_target_series(indicator, as_of)
+    latest = load_latest_series(indicator)
 
-    ts_sari = concatenate([latest_sari.drop_after(target_sari.start_time()), target_sari])
+    return concatenate([latest.drop_after(target.start_time()), target])
 
-    # load are data
-    target_are = load_target_series("are", as_of)
-    latest_are = load_latest_series("are")
 
-    ts_are = concatenate([latest_are.drop_after(target_are.start_time()), target_are])
+@lru_cache(maxsize=256)
+def _load_realtime_series(indicator, as_of, digest):
+    name = f"{indicator}-{as_of or 'latest'}"
+    path = cache_path("series", f"{name}-{digest}.pkl")
+
+    ts = read_pickle(path)
+    if ts is None:
+        ts = build_realtime_series(indicator, as_of)
+        for stale in path.parent.glob(f"{name}-*.pkl"):  # entries built from older data files
+            stale.unlink(missing_ok=True)
+        write_pickle(path, ts)
+
+    return ts
+
+
+def load_realtime_series(indicator="sari", as_of=None, use_cache=True):
+    """
+    Cached version of `build_realtime_series`.
+
+    Series are kept in an in-process LRU and pickled under CACHE_DIR/series, keyed by
+    (indicator, as_of, hash of the source CSVs), so entries are rebuilt whenever data/*.csv changes.
+    """
+    if not use_cache:
+        return build_realtime_series(indicator, as_of)
+
+    as_of = None if as_of is None else pd.Timestamp(as_of).strftime("%Y-%m-%d")
+    return _load_realtime_series(indicator, as_of, files_hash(source_files(indicator)))
+
+
+def load_realtime_training_data(as_of=None, drop_incomplete=True, use_cache=True):
+    ts_sari = load_realtime_series("sari", as_of, use_cache=use_cache)
+    ts_are = load_realtime_series("are", as_of, use_cache=use_cache)
 
     if drop_incomplete:
         return ts_sari[:-4], ts_are[:-4]  # only use complete data points
 
     else:
         return ts_sari, ts_are
+
+
+def training_vintage_hash(as_of=None, drop_incomplete=True):
+    """Hash identifying the data returned by `load_realtime_training_data(as_of, drop_incomplete)`."""
+    as_of = None if as_of is None else pd.Timestamp(as_of).strftime("%Y-%m-%d")
+    digests = [files_hash(source_files(indicator)) for indicator in ("sari", "are")]
+    return stable_hash([as_of, drop_incomplete, digests])
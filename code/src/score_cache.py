@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from config import ROOT
+from src.cache import cache_path, file_hash, read_pickle, write_pickle
+from src.forecast_archive import FORECAST_DIR, read_forecasts
+from src.load_data import add_median, add_truth, select_forecast_files
+from src.scoring_functions import forecast_metrics
+
+SCORE_CACHE = cache_path("scores", "forecast_metrics.pkl")
+
+
+def _truth_path(target: bool):
+    return ROOT / ("data/target-icosari-sari.csv" if target else "data/latest_data-icosari-sari.csv")
+
+
+def _is_current(entry: dict | None, path: str, stat: tuple[int, int], truth: str) -> bool:
+    """Whether a cached entry still holds the scores of the file: same truth file and same content."""
+    if entry is None or entry["truth"] != truth:
+        return False
+    if entry["stat"] != stat:
+        # touched or rewritten: rescore only if the content changed
+        if entry["hash"] != file_hash(FORECAST_DIR / path):
+            return False
+        entry["stat"] = stat
+    return True
+
+
+def _rows(entries: dict, paths) -> np.ndarray:
+    return np.concatenate([np.arange(entries[p]["start"], entries[p]["stop"]) for p in paths] or [np.empty(0, int)])
+
+
+def _score_files(files: pd.DataFrame, target: bool, n_jobs: int | None) -> pd.DataFrame:
+    """`forecast_metrics` of the forecast files in one pass, with the `path` of each forecast's file."""
+    df = read_forecasts(files, n_jobs=n_jobs, with_path=True)
+    df = add_truth(add_median(df), source="icosari", disease="sari", target=target)
+    return forecast_metrics(df)
+
+
+def load_forecast_metrics(
+    models=None,
+    start="2023-11-16",
+    end="2024-09-12",
+    exclude_christmas=True,
+    target=True,
+    n_jobs=None,
+):
+    """
+    `forecast_metrics(load_predictions(...))`, computed incrementally.
+
+    The per-forecast sums and counts of every forecast file are cached under the file's content
+    hash and the hash of the truth file, so only new or changed files are scored (in one pass);
+    everything else is read from cache/scores/. `aggregate_metrics` combines them to any grouping.
+    """
+    files = select_forecast_files(models, start, end, exclude_christmas)
+    truth = file_hash(_truth_path(target))
+
+    cache = read_pickle(SCORE_CACHE)
+    if cache is None or cache["root"] != str(FORECAST_DIR):
+        cache = {"root": str(FORECAST_DIR), "files": {}, "data": pd.DataFrame()}
+    entries, data = cache["files"], cache["data"]
+
+    stats = {p: (int(s), int(m)) for p, s, m in files[["path", "size", "mtime_ns"]].values}
+    touched = any(p in entries and entries[p]["stat"] != stats[p] for p in files["path"])
+    stale = files[[not _is_current(entries.get(p), p, stats[p], truth) for p in files["path"]]]
+    removed = {p for p in entries if not (FORECAST_DIR / p).exists()}
+
+    if not stale.empty or removed:
+        # kept files stay one block, the stale files are scored in one pass and appended
+        keep = [p for p in entries if p not in removed and p not in set(stale["path"])]
+        blocks = [data.take(_rows(entries, keep))]
+        sizes = [entries[p]["stop"] - entries[p]["start"] for p in keep]
+        info = [entries[p] for p in keep]
+        if not stale.empty:
+            scored = _score_files(stale, target, n_jobs)
+            file_index = pd.Categorical(scored.pop("path"), categories=stale["path"]).codes
+            blocks.append(scored.take(np.argsort(file_index, kind="stable")))
+            sizes += np.bincount(file_index, minlength=len(stale)).tolist()
+            info += [{"stat": stats[p], "hash": file_hash(FORECAST_DIR / p), "truth": truth} for p in stale["path"]]
+
+        bounds = np.cumsum([0] + sizes)
+        entries = {
+            p: {**entry, "start": int(start), "stop": int(stop)}
+            for p, entry, start, stop in zip(keep + list(stale["path"]), info, bounds[:-1], bounds[1:])
+        }
+        data = pd.concat([b for b in blocks if not b.empty] or blocks[:1], ignore_index=True)
+        cache = {"root": str(FORECAST_DIR), "files": entries, "data": data}
+    if touched or not stale.empty or removed:
+        try:
+            write_pickle(SCORE_CACHE, cache)
+        except OSError:
+            pass  # e.g. read-only checkout: files are rescored next time
+
+    return data.take(_rows(entries, files["path"])).reset_index(drop=True)
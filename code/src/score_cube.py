@@ -0,0 +1,271 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass, replace
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import AGE_GROUPS, CACHE_DIR, LOCATIONS, MODEL_NAMES, QUANTILES, ROOT
+from src.cache import file_hash, stable_hash
+from src.columnar import read_table
+from src.forecast_archive import scan_forecasts
+from src.load_data import load_predictions
+from src.scoring_functions import quantile_score
+
+SCORE_CUBE_DIR = CACHE_DIR / "score_cube"
+ARRAYS = ("forecasts", "truth", "scores", "target_end_dates")
+
+
+def _positions(index: pd.Index, labels) -> slice | np.ndarray:
+    """Positions of `labels` in `index`; a slice (so that indexing returns a view) if they are contiguous."""
+    pos = index.get_indexer(pd.Index(np.atleast_1d(labels)))
+    if (pos < 0).any():
+        missing = list(pd.Index(np.atleast_1d(labels))[pos < 0])
+        raise KeyError(f"Not on the axis: {missing}")
+    if len(pos) and (np.diff(pos) == 1).all():
+        return slice(pos[0], pos[-1] + 1)
+    return pos
+
+
+def _stratum_mask(strata: pd.MultiIndex, level: str) -> np.ndarray:
+    """Strata selected by `load_data.filter_by_level`."""
+    location = strata.get_level_values("location")
+    age_group = strata.get_level_values("age_group")
+    if level == "national":
+        return (location == "DE") & (age_group == "00+")
+    if level == "age":
+        return (location == "DE") & (age_group != "00+")
+    if level == "states":
+        return location != "DE"
+    raise ValueError(f"Unknown level: {level!r}")
+
+
+@dataclass(frozen=True)
+class ScoreCube:
+    """
+    Dense (model × forecast_date × stratum × horizon × quantile) forecasts with their truth and
+    quantile scores.
+
+    Models, strata (location, age_group) and quantiles are the axes defined in config, forecast
+    dates and horizons those present in the forecasts. Missing forecasts and truth are NaN.
+    Selections with `sel` are views of the (possibly memory-mapped) arrays whenever the selected
+    labels are contiguous on their axis.
+    """
+
+    models: pd.Index
+    forecast_dates: pd.DatetimeIndex
+    strata: pd.MultiIndex
+    horizons: pd.Index
+    quantiles: pd.Index
+    forecasts: np.ndarray  # (model, forecast_date, stratum, horizon, quantile)
+    truth: np.ndarray  # (forecast_date, stratum, horizon)
+    scores: np.ndarray  # (model, forecast_date, stratum, horizon, quantile)
+    target_end_dates: np.ndarray  # (forecast_date, horizon), datetime64[ns]
+
+    @classmethod
+    def from_frame(cls, df, df_truth):
+        """Build the cube from long-format quantile forecasts and a (location, age_group, date, value) truth table."""
+        df = df[df["type"] == "quantile"]
+        models = pd.Index(list(dict.fromkeys(MODEL_NAMES.values())), name="model")
+        forecast_dates = pd.DatetimeIndex(np.unique(pd.to_datetime(df["forecast_date"])), name="forecast_date")
+        strata = pd.MultiIndex.from_tuples(list(product(LOCATIONS, AGE_GROUPS)), names=["location", "age_group"])
+        horizons = pd.Index(np.unique(df["horizon"].to_numpy()), name="horizon")
+        quantiles = pd.Index(QUANTILES, name="quantile")
+
+        m = models.get_indexer(df["model"])
+        d = forecast_dates.get_indexer(pd.to_datetime(df["forecast_date"]))
+        s = strata.get_indexer(pd.MultiIndex.from_frame(df[["location", "age_group"]].astype(str)))
+        h = horizons.get_indexer(df["horizon"])
+        q = quantiles.get_indexer(df["quantile"].astype(float))
+        ok = (m >= 0) & (s >= 0) & (q >= 0)  # rows outside the config axes are dropped
+
+        forecasts = np.full((len(models), len(forecast_dates), len(strata), len(horizons), len(quantiles)), np.nan)
+        forecasts[m[ok], d[ok], s[ok], h[ok], q[ok]] = df["value"].to_numpy(dtype=float)[ok]
+
+        target_end_dates = np.full((len(forecast_dates), len(horizons)), np.datetime64("NaT"), dtype="datetime64[ns]")
+        target_end_dates[d, h] = pd.to_datetime(df["target_end_date"]).to_numpy()
+
+        shape = (len(forecast_dates), len(strata), len(horizons))
+        keys = pd.MultiIndex.from_arrays(
+            [
+                np.broadcast_to(strata.get_level_values("location").to_numpy()[None, :, None], shape).ravel(),
+                np.broadcast_to(strata.get_level_values("age_group").to_numpy()[None, :, None], shape).ravel(),
+                np.broadcast_to(target_end_dates[:, None, :], shape).ravel(),
+            ]
+        )
+        pos = pd.MultiIndex.from_frame(df_truth[["location", "age_group", "date"]]).get_indexer(keys)
+        truth = np.where(pos >= 0, df_truth["value"].to_numpy(dtype=float)[pos], np.nan).reshape(shape)
+
+        scores = quantile_score(forecasts, truth[None, ..., None], quantiles.to_numpy())
+
+        return cls(
+            models=models,
+            forecast_dates=forecast_dates,
+            strata=strata,
+            horizons=horizons,
+            quantiles=quantiles,
+            forecasts=forecasts,
+            truth=truth,
+            scores=scores,
+            target_end_dates=target_end_dates,
+        )
+
+    def sel(self, models=None, forecast_dates=None, level=None, horizons=None):
+        """Sub-cube of the given models, forecast dates, `filter_by_level` level and horizons (views where possible)."""
+        m = slice(None) if models is None else _positions(self.models, models)
+        d = slice(None) if forecast_dates is None else _positions(self.forecast_dates, pd.to_datetime(forecast_dates))
+        s = slice(None)
+        if level is not None:
+            s = _positions(self.strata, self.strata[_stratum_mask(self.strata, level)])
+        h = slice(None) if horizons is None else _positions(self.horizons, horizons)
+
+        # index one axis at a time: basic slices give views, position arrays copy only that axis
+        def take(a, axes):
+            for axis, idx in axes:
+                a = a[(slice(None),) * axis + (idx,)]
+            return a
+
+        return replace(
+            self,
+            models=self.models[m],
+            forecast_dates=self.forecast_dates[d],
+            strata=self.strata[s],
+            horizons=self.horizons[h],
+            forecasts=take(self.forecasts, [(0, m), (1, d), (2, s), (3, h)]),
+            scores=take(self.scores, [(0, m), (1, d), (2, s), (3, h)]),
+            truth=take(self.truth, [(0, d), (1, s), (2, h)]),
+            target_end_dates=take(self.target_end_dates, [(0, d), (1, h)]),
+        )
+
+    @property
+    def available(self):
+        """Forecasts with at least one quantile, shape (model, forecast_date, stratum, horizon)."""
+        return ~np.isnan(self.forecasts).all(axis=-1)
+
+    def wis(self):
+        """Mean quantile score over the available quantiles, shape (model, forecast_date, stratum, horizon)."""
+        observed = ~np.isnan(self.scores)
+        n = observed.sum(axis=-1)
+        total = np.where(observed, self.scores, 0).sum(axis=-1)
+        return np.divide(total, n, out=np.full(n.shape, np.nan), where=n > 0)
+
+    def coverage(self, level):
+        """Whether the truth lies in the central `level` interval, e.g. 0.5 or 0.95 (False where unavailable)."""
+        lower = self.forecasts[..., self.quantiles.get_loc(round((1 - level) / 2, 6))]
+        upper = self.forecasts[..., self.quantiles.get_loc(round((1 + level) / 2, 6))]
+        return (self.truth >= lower) & (self.truth <= upper)
+
+    def to_frame(self, values, name="value"):
+        """Long DataFrame of a (model, forecast_date, stratum, horizon) array, e.g. `wis()`, for the available forecasts."""
+        m, d, s, h = np.nonzero(self.available)
+        return pd.DataFrame(
+            {
+                "model": self.models[m],
+                "forecast_date": self.forecast_dates[d],
+                "location": self.strata.get_level_values("location")[s],
+                "age_group": self.strata.get_level_values("age_group")[s],
+                "horizon": self.horizons[h],
+                "target_end_date": self.target_end_dates[d, h],
+                name: values[m, d, s, h],
+            }
+        )
+
+    def _per_model_quantile(self, values, mask, name):
+        """Mean of `values` over the forecasts in `mask`, per model and quantile level (models with forecasts)."""
+        n = mask.sum(axis=(1, 2, 3))
+        mean = np.where(mask, values, 0).sum(axis=(1, 2, 3)) / np.maximum(n, 1)
+        m, q = np.nonzero(n)
+        return pd.DataFrame({"model": self.models[m], "quantile": self.quantiles[q], name: mean[m, q]})
+
+    def quantile_scores(self):
+        """Mean quantile score per model and quantile level."""
+        return self._per_model_quantile(self.scores, ~np.isnan(self.scores), "score")
+
+    def quantile_coverage(self):
+        """Share of forecasts per model and quantile level whose quantile is at or above the truth (missing truth: not covered)."""
+        covered = self.truth[None, ..., None] <= self.forecasts
+        return self._per_model_quantile(covered, ~np.isnan(self.forecasts), "covered")
+
+    def save(self, path: Path) -> None:
+        """Write the arrays as .npy files plus an index.json with the axes; the directory is renamed into place."""
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(getattr(self, name)), allow_pickle=False)
+        index = {
+            "models": self.models.tolist(),
+            "forecast_dates": self.forecast_dates.strftime("%Y-%m-%d").tolist(),
+            "strata": [list(s) for s in self.strata],
+            "horizons": self.horizons.tolist(),
+            "quantiles": self.quantiles.tolist(),
+        }
+        (tmp / "index.json").write_text(json.dumps(index))
+        try:
+            os.rename(tmp, path)
+        except OSError:  # written concurrently by another process
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path, mmap_mode="r"):
+        """Read a saved cube; the arrays are memory-mapped by default."""
+        path = Path(path)
+        index = json.loads((path / "index.json").read_text())
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False) for name in ARRAYS}
+        return cls(
+            models=pd.Index(index["models"], name="model"),
+            forecast_dates=pd.DatetimeIndex(index["forecast_dates"], name="forecast_date"),
+            strata=pd.MultiIndex.from_tuples([tuple(s) for s in index["strata"]], names=["location", "age_group"]),
+            horizons=pd.Index(index["horizons"], name="horizon"),
+            quantiles=pd.Index(index["quantiles"], name="quantile"),
+            **arrays,
+        )
+
+
+def _remove_other_cubes(path: Path) -> None:
+    """Delete the cubes next to `path` (older keys of the same selection); cubes being written are kept."""
+    for entry in path.parent.iterdir():
+        if entry != path and entry.is_dir() and not entry.name.startswith("."):
+            shutil.rmtree(entry, ignore_errors=True)
+    for entry in SCORE_CUBE_DIR.iterdir():
+        if (entry / "index.json").exists():  # cubes stored without a selection directory
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def load_score_cube(start="2023-11-16", end="2024-09-12", exclude_christmas=True, target=True):
+    """
+    Score cube of all forecasts in the archive (see `load_predictions`), scored against the target
+    (or with `target=False` the latest) data. Built once and memory-mapped from cache/score_cube/ until a forecast CSV or the truth
+    file changes; only the current cube of each selection (dates, target) is kept on disk.
+    """
+    truth_path = ROOT / ("data/target-icosari-sari.csv" if target else "data/latest_data-icosari-sari.csv")
+    selection = stable_hash(dict(start=start, end=end, exclude_christmas=exclude_christmas, target=target))
+    files = scan_forecasts()
+    key = stable_hash(
+        dict(
+            files=files[["path", "size", "mtime_ns"]].values.tolist(),
+            truth=file_hash(truth_path),
+            axes=[list(MODEL_NAMES.values()), LOCATIONS, AGE_GROUPS, QUANTILES],
+        )
+    )
+    path = SCORE_CUBE_DIR / selection / key
+    if (path / "index.json").exists():
+        return ScoreCube.load(path)
+
+    df = load_predictions(
+        start=start,
+        end=end,
+        exclude_christmas=exclude_christmas,
+        include_median=False,
+        include_truth=False,
+    )
+    cube = ScoreCube.from_frame(df, read_table(truth_path, parse_dates=["date"]))
+    try:
+        cube.save(path)
+    except OSError:
+        return cube  # e.g. read-only checkout
+    _remove_other_cubes(path)
+    return ScoreCube.load(path)
@@ -1,9 +1,14 @@
-from src.load_data import filter_by_level
+import numpy as np
+import pandas as pd
 
+from config import EVAL_MEMORY_LIMIT
+from src.forecast_archive import read_forecasts
+from src.load_data import add_median, add_truth, filter_by_level, select_forecast_files
 
-# Quantile score function
+
+# Quantile score function (scalars or arrays)
 def quantile_score(q, y, alpha):
-    return 2 * (int(y < q) - alpha) * (q - y)
+    return 2 * (np.less(y, q).astype(int) - alpha) * (q - y)
 
 
 # Compute squared error, absolute error or quantile score based on "type"
@@ -22,14 +27,24 @@ def compute_row_score(row):
     return round(score(row["value"], row["truth"], row["type"], row["quantile"]), 5)
 
 
-# Compute scores for each row in a dataframe
+# Compute scores for each row in a dataframe (one vectorized pass per score type)
 def compute_scores(df):
-    df["score"] = df.apply(compute_row_score, axis=1)
+    types = df["type"].to_numpy()
+    prediction = df["value"].to_numpy(dtype=float)
+    observation = df["truth"].to_numpy(dtype=float)
+    quantile = df["quantile"].to_numpy(dtype=float)
+
+    scores = np.empty(len(df))
+    for score_type in pd.unique(types):
+        mask = types == score_type
+        scores[mask] = score(prediction[mask], observation[mask], score_type, quantile[mask])
+
+    df["score"] = [round(s, 5) for s in scores.tolist()]  # Python's (correctly rounded) round
     return df.drop(columns=["value", "truth"])
 
 
-# Compute WIS decomposition
-def compute_wis(df):
+# WIS decomposition of every quantile row
+def compute_wis_raw(df):
     # Filter rows where 'quantile' is 0.5, rename 'value' to 'med', and drop unnecessary columns
     df_median = df[df["quantile"] == 0.5].copy()
     df_median = df_median.rename(columns={"value": "med"}).drop(
@@ -40,27 +55,28 @@ def compute_wis(df):
     df_quantile = df[df["type"] == "quantile"].copy()
     df = df_quantile.merge(df_median, how="left")
 
-    # Compute scores and other metrics row-wise
-    df["wis"] = df.apply(
-        lambda row: score(row["value"], row["truth"], row["type"], row["quantile"]),
-        axis=1,
-    )
-    df["spread"] = df.apply(
-        lambda row: score(row["value"], row["med"], row["type"], row["quantile"]),
-        axis=1,
-    )
-    df["overprediction"] = df.apply(
-        lambda row: row["wis"] - row["spread"] if row["med"] > row["truth"] else 0,
-        axis=1,
-    )
-    df["underprediction"] = df.apply(
-        lambda row: row["wis"] - row["spread"] if row["med"] < row["truth"] else 0,
-        axis=1,
-    )
+    # Compute scores and other metrics column-wise
+    value = df["value"].to_numpy(dtype=float)
+    truth = df["truth"].to_numpy(dtype=float)
+    med = df["med"].to_numpy(dtype=float)
+    alpha = df["quantile"].to_numpy(dtype=float)
+
+    df["wis"] = quantile_score(value, truth, alpha)
+    df["spread"] = quantile_score(value, med, alpha)
+    excess = df["wis"].to_numpy() - df["spread"].to_numpy()
+    df["overprediction"] = np.where(med > truth, excess, 0)
+    df["underprediction"] = np.where(med < truth, excess, 0)
+
+    return df
+
+
+# Compute WIS decomposition
+def compute_wis(df):
+    df = compute_wis_raw(df)
 
     # Group by 'model' and compute the mean for each metric
     result_df = (
-        df.groupby("model")
+        df.groupby("model", observed=True)
         .agg(
             {
                 "spread": "mean",
@@ -101,7 +117,7 @@ def compute_coverage(df):
     df_wide["c50"] = (df_wide["truth"] >= df_wide["quantile_0.25"]) & (df_wide["truth"] <= df_wide["quantile_0.75"])
     df_wide["c95"] = (df_wide["truth"] >= df_wide["quantile_0.025"]) & (df_wide["truth"] <= df_wide["quantile_0.975"])
 
-    coverage_df = df_wide.groupby("model").agg(c50=("c50", "mean"), c95=("c95", "mean")).reset_index()
+    coverage_df = df_wide.groupby("model", observed=True).agg(c50=("c50", "mean"), c95=("c95", "mean")).reset_index()
 
     return coverage_df
 
@@ -109,40 +125,156 @@ def compute_coverage(df):
 def compute_ae(df):
     df_ae = df[df["quantile"] == 0.5].copy()
     df_ae["ae"] = abs(df_ae.value - df_ae.truth)
-    return df_ae.groupby("model").agg({"ae": "mean"}).reset_index()
+    return df_ae.groupby("model", observed=True).agg({"ae": "mean"}).reset_index()
+
+
+# Single-pass engine: per-forecast metric sums, aggregated to any grouping
+METRIC_COLUMNS = ["spread", "overprediction", "underprediction", "wis", "ae", "c50", "c95"]
+
+
+def forecast_metrics(df):
+    """
+    Score every forecast (all rows that share everything but type, quantile and value) in one
+    vectorized pass. Returns one row per forecast with its key columns and the sums and counts
+    that `aggregate_metrics` turns into the same means as compute_wis, compute_ae and
+    compute_coverage, for any grouping.
+    """
+    keys = [c for c in df.columns if c not in ("type", "quantile", "value")]
+    forecast_id = df.groupby(keys, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    first = np.unique(forecast_id, return_index=True)[1]
+    n = len(first)
+    out = df[keys].iloc[first].reset_index(drop=True)
+
+    value = df["value"].to_numpy(dtype=float)
+    alpha = df["quantile"].to_numpy(dtype=float)
+    truth = df["truth"].to_numpy(dtype=float)
+    is_quantile = (df["type"] == "quantile").to_numpy()
+
+    # quantile forecasts as a (forecast × quantile level) matrix
+    ids, v, y, a = forecast_id[is_quantile], value[is_quantile], truth[is_quantile], alpha[is_quantile]
+    levels = np.unique(a)
+    wide = np.full((n, len(levels)), np.nan)
+    wide[ids, np.searchsorted(levels, a)] = v
+
+    def level(q):
+        return wide[:, np.searchsorted(levels, q)] if q in levels else np.full(n, np.nan)
+
+    def total(i, weights):
+        return np.bincount(i, weights=weights, minlength=n)
+
+    # WIS decomposition of the quantile rows
+    med = level(0.5)[ids]
+    wis = quantile_score(v, y, a)
+    spread = quantile_score(v, med, a)
+    out["n_quantiles"] = total(ids, None)
+    out["wis_sum"], out["wis_n"] = total(ids, np.nan_to_num(wis)), total(ids, ~np.isnan(wis))
+    out["spread_sum"], out["spread_n"] = total(ids, np.nan_to_num(spread)), total(ids, ~np.isnan(spread))
+    out["overprediction_sum"] = total(ids, np.where(med > y, wis - spread, 0))
+    out["underprediction_sum"] = total(ids, np.where(med < y, wis - spread, 0))
+
+    # absolute error of all rows at quantile level 0.5 (quantile and median type)
+    is_median = alpha == 0.5
+    ae = np.abs(value[is_median] - truth[is_median])
+    out["ae_sum"] = total(forecast_id[is_median], np.nan_to_num(ae))
+    out["ae_n"] = total(forecast_id[is_median], ~np.isnan(ae))
+
+    # interval coverage of the forecasts with quantiles
+    y = out["truth"].to_numpy(dtype=float)
+    out["c_n"] = out["n_quantiles"] > 0
+    out["c50_sum"] = (y >= level(0.25)) & (y <= level(0.75)) & out["c_n"]
+    out["c95_sum"] = (y >= level(0.025)) & (y <= level(0.975)) & out["c_n"]
+
+    return out
+
+
+def metric_totals(metrics, by="model"):
+    """
+    Sums and counts of the output of `forecast_metrics` per group of `by`. Totals of disjoint
+    sets of forecasts are merged by adding them (see `merge_totals`).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    sums = [c for c in metrics.columns if c.endswith(("_sum", "_n")) or c == "n_quantiles"]
+    return metrics[metrics["n_quantiles"] > 0].groupby(by, observed=True)[sums].sum().astype(float)
+
+
+def merge_totals(totals, other):
+    return other if totals is None else totals.add(other, fill_value=0)
+
+
+def metrics_from_totals(g):
+    """Mean scores (METRIC_COLUMNS) from `metric_totals`, sorted by the non-model keys and WIS."""
+    result = pd.DataFrame(
+        {
+            "spread": g["spread_sum"] / g["spread_n"],
+            "overprediction": g["overprediction_sum"] / g["n_quantiles"],
+            "underprediction": g["underprediction_sum"] / g["n_quantiles"],
+            "wis": g["wis_sum"] / g["wis_n"],
+            "ae": g["ae_sum"] / g["ae_n"],
+            "c50": g["c50_sum"] / g["c_n"],
+            "c95": g["c95_sum"] / g["c_n"],
+        }
+    ).reset_index()
+    return result.sort_values([c for c in g.index.names if c != "model"] + ["wis"], ignore_index=True)
+
+
+def aggregate_metrics(metrics, by="model"):
+    """
+    Mean scores (METRIC_COLUMNS) per group of `by` (column name or list, e.g. ["horizon", "model"])
+    from the output of `forecast_metrics`, sorted by the non-model keys and WIS.
+    """
+    return metrics_from_totals(metric_totals(metrics, by))
+
+
+def compute_metrics(df, by="model"):
+    """WIS decomposition, AE and c50/c95 coverage per group of `by`, in a single pass over `df`."""
+    return aggregate_metrics(forecast_metrics(df), by)
 
 
 def evaluate_models(df, level="national", by_horizon=False, by_age=False):
-    df_temp = filter_by_level(df, level)
-    if by_horizon:
-        wis_temp = df_temp.groupby("horizon")[df_temp.columns].apply(compute_wis).reset_index().drop(columns="level_1")
-        ae_temp = df_temp.groupby("horizon")[df_temp.columns].apply(compute_ae).reset_index().drop(columns="level_1")
-        coverage_temp = (
-            df_temp.groupby("horizon")[df_temp.columns].apply(compute_coverage).reset_index().drop(columns="level_1")
-        )
-        results = (
-            wis_temp.merge(ae_temp, on=["model", "horizon"])
-            .merge(coverage_temp, on=["model", "horizon"])
-            .sort_values(["horizon", "wis"], ignore_index=True)
-        )
-    elif by_age:
-        wis_temp = (
-            df_temp.groupby("age_group")[df_temp.columns].apply(compute_wis).reset_index().drop(columns="level_1")
-        )
-        ae_temp = df_temp.groupby("age_group")[df_temp.columns].apply(compute_ae).reset_index().drop(columns="level_1")
-        coverage_temp = (
-            df_temp.groupby("age_group")[df_temp.columns].apply(compute_coverage).reset_index().drop(columns="level_1")
-        )
-        results = (
-            wis_temp.merge(ae_temp, on=["model", "age_group"])
-            .merge(coverage_temp, on=["model", "age_group"])
-            .sort_values(["age_group", "wis"], ignore_index=True)
-        )
-    else:
-        wis_temp = compute_wis(df_temp)
-        ae_temp = compute_ae(df_temp)
-        coverage_temp = compute_coverage(df_temp)
-        results = (
-            wis_temp.merge(ae_temp, on="model").merge(coverage_temp, on="model").sort_values("wis", ignore_index=True)
-        )
-    return results
+    by = ["horizon", "model"] if by_horizon else ["age_group", "model"] if by_age else ["model"]
+    return compute_metrics(filter_by_level(df, level), by)
+
+
+# Streaming evaluation: the archive is scored in chunks of files and only the totals are kept
+CSV_EXPANSION = 10  # peak bytes in memory per byte of forecast CSV while a chunk is scored (~6 measured)
+
+
+def file_chunks(files, memory_limit=EVAL_MEMORY_LIMIT):
+    """Split `files` (see `scan_forecasts`) into consecutive chunks whose estimated peak memory is below `memory_limit`."""
+    chunk, size = [], 0
+    for i, nbytes in enumerate(files["size"] * CSV_EXPANSION):
+        if chunk and size + nbytes > memory_limit:
+            yield files.iloc[chunk]
+            chunk, size = [], 0
+        chunk.append(i)
+        size += nbytes
+    if chunk:
+        yield files.iloc[chunk]
+
+
+def stream_evaluate_models(
+    level="national",
+    by_horizon=False,
+    by_age=False,
+    models=None,
+    start="2023-11-16",
+    end="2024-09-12",
+    exclude_christmas=True,
+    target=True,
+    memory_limit=EVAL_MEMORY_LIMIT,
+):
+    """
+    `evaluate_models(load_predictions(...), ...)` without loading the archive: the forecast files
+    are read in chunks that fit into `memory_limit` bytes (estimated from the CSV sizes, a single
+    file is never split) and reduced to per-group totals, so memory does not grow with the archive.
+    """
+    by = ["horizon", "model"] if by_horizon else ["age_group", "model"] if by_age else ["model"]
+    totals = None
+    for chunk in file_chunks(select_forecast_files(models, start, end, exclude_christmas), memory_limit):
+        # bypass the forecast cache, which holds the whole archive
+        df = filter_by_level(read_forecasts(chunk, n_jobs=1, use_cache=False), level)
+        df = add_truth(add_median(df), source="icosari", disease="sari", target=target)
+        totals = merge_totals(totals, metric_totals(forecast_metrics(df), by))
+    if totals is None:
+        raise ValueError("No forecast files match the selection")
+    return metrics_from_totals(totals)
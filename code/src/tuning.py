@@ -1,4 +1,9 @@
 import ast
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Iterable, Sequence
 
 import numpy as np
 import pandas as pd
@@ -6,8 +11,12 @@ import torch
 from darts import TimeSeries
 from darts.models import TSMixerModel
 from epiweeks import Week
+from tqdm import tqdm
 
-from config import ALLOWED_MODELS, OPTIMIZER_DICT, ROOT, ModelName
+from config import ALLOWED_MODELS, METRIC, METRIC_KWARGS, OPTIMIZER_DICT, QUANTILES, ROOT, ModelName
+from src.cache import stable_hash
+from src.design_cache import CachedLightGBMModel
+from src.tuning_store import append_result, best_result
 
 
 def compute_validation_score(
@@ -21,7 +30,14 @@ def compute_validation_score(
     metric_kwargs,
     enable_optimization=True,
     sample_weight=None,
+    return_quantile_scores=False,
 ):
+    """Fit the model and compute its mean quantile loss on the validation backtest.
+
+    With ``return_quantile_scores=True`` (requires a vectorized quantile metric
+    such as ``METRIC``) the per-quantile losses, averaged over series, are
+    returned as well, indexed by quantile level.
+    """
     # torch model: add dataloader_kwargs
     if isinstance(model, TSMixerModel):
         model.fit(
@@ -55,8 +71,13 @@ def compute_validation_score(
     )
 
     score = np.mean(scores)
+    score = score if not np.isnan(score) else float("inf")
 
-    return score if not np.isnan(score) else float("inf")
+    if return_quantile_scores:
+        quantiles = metric_kwargs["q"]
+        quantile_scores = np.asarray(scores, dtype=float).reshape(-1, len(quantiles)).mean(axis=0)
+        return score, pd.Series(quantile_scores, index=quantiles, name="quantile_loss")
+    return score
 
 
 def get_season_end(start_year):
@@ -102,9 +123,9 @@ def get_best_parameters(
     return_score: bool = False,
 ) -> dict | tuple:
     """
-    Loads a gridsearch CSV and returns the configuration with the lowest WIS.
-    Optionally filters by covariates and sample weight, parses covariate columns,
-    and drops error columns.
+    Returns the configuration with the lowest WIS from a gridsearch CSV (queried through the
+    indexed tuning store, see `src.tuning_store`). Optionally filters by covariates and
+    sample weight, parses covariate columns, and drops error columns.
 
     Args:
         model (ModelName): Model name used to construct the gridsearch CSV file path.
@@ -121,24 +142,25 @@ def get_best_parameters(
     if model not in ALLOWED_MODELS:
         raise ValueError(f"Unknown model: {model}")
 
-    gs = pd.read_csv(ROOT / "results" / "tuning" / f"gridsearch_{model}.csv")
-
-    # Optional filtering
-    if use_covariates is not None and "use_covariates" in gs.columns:
-        gs = gs[gs["use_covariates"] == use_covariates]
-    if sample_weight is not None and "sample_weight" in gs.columns:
-        gs = gs[gs["sample_weight"] == sample_weight]
+    # Optional filtering (indexed query on the tuning store, memoized until the CSV changes)
+    filters = {}
+    if use_covariates is not None:
+        filters["use_covariates"] = use_covariates
+    if sample_weight is not None:
+        filters["sample_weight"] = sample_weight
+    best_row = best_result(ROOT / "results" / "tuning" / f"gridsearch_{model}.csv", **filters)
+    if best_row is None:
+        raise ValueError(f"No grid-search results for {model} with {filters}")
 
     # Convert string representations of covariate lags back into Python objects
     for col in ["lags_past_covariates", "lags_future_covariates"]:
-        if col in gs.columns:
-            gs[col] = gs[col].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+        if isinstance(best_row.get(col), str):
+            best_row[col] = ast.literal_eval(best_row[col])
 
     # Drop error columns if present
-    gs = gs.drop(columns=[c for c in ["error_flag", "error_msg"] if c in gs.columns])
+    for key in ["error_flag", "error_msg"]:
+        best_row.pop(key, None)
 
-    # Find row with lowest WIS
-    best_row = gs.loc[gs["WIS"].idxmin()].to_dict()
     wis = best_row.pop("WIS")
 
     # Remove extra WIS columns if present
@@ -167,3 +189,377 @@ def get_best_parameters(
     params = {k: best_row[k] for k in sorted(best_row)}
 
     return (params, float(wis)) if return_score else params
+
+
+# ---- grid search runner
+def _canonical(value):
+    """Normalize a config value so that a config and its CSV round trip hash identically."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)  # 0 and 0.0 are the same config
+    return value
+
+
+def config_hash(cfg: dict) -> str:
+    """Stable hash of a grid-search config (insensitive to key order and int/float or tuple/list)."""
+    return stable_hash(_canonical(cfg))
+
+
+def read_gridsearch_scores(out_csv: Path, param_cols: Sequence[str]) -> dict:
+    """WIS per config hash for all rows of the grid-search CSV `out_csv` (NaN for failed configs)."""
+    if not os.path.exists(out_csv):
+        return {}
+
+    gs = pd.read_csv(out_csv)
+    for col in ["lags_past_covariates", "lags_future_covariates"]:
+        if col in gs.columns:
+            gs[col] = gs[col].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+
+    return {config_hash(row): wis for row, wis in zip(gs[list(param_cols)].to_dict("records"), gs["WIS"])}
+
+
+def completed_config_hashes(out_csv: Path, param_cols: Sequence[str]) -> set:
+    """Hashes of all configs that already have a row in the grid-search CSV `out_csv`."""
+    return set(read_gridsearch_scores(out_csv, param_cols))
+
+
+def evaluate_lightgbm(cfg: dict, data: dict) -> dict:
+    """Validation WIS of a LightGBM grid-search config."""
+    lags_past = cfg["lags_past_covariates"] if cfg["use_covariates"] else None
+    lags_future = cfg["lags_future_covariates"] if cfg["use_encoders"] else None
+    n_threads = data.get("n_threads")
+
+    model = CachedLightGBMModel(
+        lags=cfg["lags"],
+        lags_past_covariates=lags_past,
+        lags_future_covariates=lags_future,
+        num_leaves=cfg["num_leaves"],
+        max_depth=cfg["max_depth"],
+        learning_rate=cfg["learning_rate"],
+        n_estimators=cfg["n_estimators"],
+        min_child_samples=cfg["min_child_samples"],
+        subsample=cfg["subsample"],
+        colsample_bytree=cfg["colsample_bytree"],
+        reg_alpha=cfg["reg_alpha"],
+        reg_lambda=cfg["reg_lambda"],
+        subsample_freq=cfg["subsample_freq"],
+        min_split_gain=cfg["min_split_gain"],
+        max_bin=cfg["max_bin"],
+        use_static_covariates=cfg["use_static_covariates"],
+        add_encoders=data["encoders"] if cfg["use_encoders"] else None,
+        verbose=-1,
+        likelihood="quantile",
+        quantiles=QUANTILES,
+        **data["shared_args"],
+        **({"n_jobs": n_threads} if n_threads is not None else {}),
+        random_state=data["seeds"][0],
+    )
+
+    weight = data["custom_weights"] if cfg["sample_weight"] == "no-covid" else cfg["sample_weight"]
+    score = compute_validation_score(
+        model,
+        data["targets_train"],
+        data["targets_validation"],
+        data["covariates"] if cfg["use_covariates"] else None,
+        data["horizon"],
+        data["num_samples"],
+        METRIC,
+        METRIC_KWARGS,
+        sample_weight=weight,
+    )
+    return {"WIS": score}
+
+
+def evaluate_tsmixer(cfg: dict, data: dict) -> dict:
+    """Validation WIS of a TSMixer grid-search config, per seed (WIS_<seed>) and aggregated."""
+    optimizer = OPTIMIZER_DICT[cfg["optimizer"]]
+    use_covariates = cfg["use_covariates"]
+    sample_weight = cfg["sample_weight"]
+
+    scores = {}
+    for seed in data["seeds"]:
+        model = TSMixerModel(
+            input_chunk_length=cfg["input_chunk_length"],
+            hidden_size=cfg["hidden_size"],
+            ff_size=cfg["ff_size"],
+            num_blocks=cfg["num_blocks"],
+            dropout=cfg["dropout"],
+            norm_type=cfg["norm_type"],
+            batch_size=cfg["batch_size"],
+            n_epochs=cfg["n_epochs"],
+            normalize_before=cfg["normalize_before"],
+            activation=cfg["activation"],
+            optimizer_cls=optimizer,
+            optimizer_kwargs={
+                "lr": cfg["optimizer_kwargs.lr"],
+                "weight_decay": cfg["optimizer_kwargs.weight_decay"],
+            },
+            use_static_covariates=cfg["use_static_covariates"],
+            add_encoders=data["encoders"] if cfg["use_encoders"] else None,
+            **data["shared_args"],
+            random_state=seed,
+        )
+
+        score = compute_validation_score(
+            model,
+            data["targets_train"],
+            data["targets_validation"],
+            data["covariates"] if use_covariates else None,
+            data["horizon"],
+            data["num_samples"],
+            METRIC,
+            METRIC_KWARGS,
+            sample_weight=data["custom_weights"] if sample_weight == "no-covid" else sample_weight,
+        )
+        scores[f"WIS_{seed}"] = score
+
+    per_seed = list(scores.values())
+    scores["WIS"] = np.mean(per_seed)
+    scores["WIS_std"] = np.std(per_seed)
+    return scores
+
+
+EVALUATORS: dict[ModelName, Callable[[dict, dict], dict]] = {
+    "lightgbm": evaluate_lightgbm,
+    "tsmixer": evaluate_tsmixer,
+}
+
+
+def evaluate_config(
+    model: ModelName, cfg: dict, data: dict, param_cols: Sequence[str], score_cols: Sequence[str]
+) -> dict:
+    """One grid-search CSV row for `cfg`; failures are recorded in error_flag/error_msg."""
+    row = {k: cfg.get(k) for k in param_cols}
+    try:
+        res = EVALUATORS[model](cfg, data)
+        row.update({sc: res.get(sc, np.nan) for sc in score_cols})
+        row.update({"error_flag": False, "error_msg": ""})
+    except Exception as e:
+        row.update({sc: np.nan for sc in score_cols})
+        row.update({"error_flag": True, "error_msg": str(e)})
+    return row
+
+
+# process-pool workers: the preloaded series are sent once per worker via the initializer
+_TUNING_CONTEXT: dict = {}
+
+
+def _init_tuning_worker(context: dict, n_threads: int) -> None:
+    from src.silence import silence
+
+    silence()
+    torch.set_num_threads(n_threads)
+    _TUNING_CONTEXT.update(context, data={**context["data"], "n_threads": n_threads})
+
+
+def _evaluate_in_worker(cfg: dict) -> dict:
+    return evaluate_config(cfg=cfg, **_TUNING_CONTEXT)
+
+
+def evaluate_configs(
+    model: ModelName,
+    configs: Sequence[dict],
+    data: dict,
+    out_csv: Path,
+    param_cols: Sequence[str],
+    score_cols: Sequence[str] = ("WIS",),
+    n_jobs: int = -1,
+    desc: str = "Grid search",
+) -> list[dict]:
+    """
+    Evaluate `configs` in a pool of `n_jobs` worker processes (-1: one per CPU) and return their rows.
+
+    `data` holds the preloaded series and settings used by the evaluator of `model`
+    (targets_train, targets_validation, covariates, custom_weights, encoders, shared_args,
+    seeds, horizon, num_samples); it is sent to each worker once. Every row is appended to
+    `out_csv` (and the tuning store) as soon as it finishes.
+    """
+    header = list(param_cols) + list(score_cols) + ["error_flag", "error_msg"]
+    if not os.path.exists(out_csv):
+        pd.DataFrame(columns=header).to_csv(out_csv, index=False)
+
+    rows = []
+
+    def write(row: dict, pbar) -> None:
+        append_result(out_csv, row, header)
+        rows.append(row)
+        wis = row["WIS"]
+        pbar.set_postfix({"WIS": f"{wis:.4f}" if not np.isnan(wis) else "nan"})
+        pbar.update()
+
+    pbar = tqdm(total=len(configs), desc=desc, unit="trial")
+    if n_jobs == 1 or len(configs) <= 1:
+        for cfg in configs:
+            write(evaluate_config(model, cfg, data, param_cols, score_cols), pbar)
+        pbar.close()
+        return rows
+
+    n_cpus = os.cpu_count() or 1
+    n_workers = min(len(configs), n_cpus if n_jobs == -1 else n_jobs)
+    context = dict(model=model, data=data, param_cols=list(param_cols), score_cols=list(score_cols))
+
+    # spawn: forking after LightGBM/torch have started their OpenMP thread pools can deadlock
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_tuning_worker,
+        initargs=(context, max(1, n_cpus // n_workers)),
+    ) as ex:
+        futures = [ex.submit(_evaluate_in_worker, cfg) for cfg in configs]
+        for fut in as_completed(futures):
+            write(fut.result(), pbar)
+    pbar.close()
+    return rows
+
+
+def run_gridsearch(
+    model: ModelName,
+    configs: Iterable[dict],
+    data: dict,
+    out_csv: Path,
+    param_cols: Sequence[str],
+    score_cols: Sequence[str] = ("WIS",),
+    resume: bool = True,
+    n_jobs: int = -1,
+) -> None:
+    """
+    Exhaustive grid search: evaluate all configs in parallel (see `evaluate_configs`).
+
+    With `resume`, configs whose hash (see `config_hash`) already has a row in `out_csv` are skipped.
+    """
+    done = completed_config_hashes(out_csv, param_cols) if resume else set()
+    configs = [c for c in configs if config_hash(c) not in done]
+    evaluate_configs(model, configs, data, out_csv, param_cols, score_cols, n_jobs=n_jobs)
+
+
+def rungs_csv(out_csv: Path) -> Path:
+    """CSV next to the grid-search CSV `out_csv` that holds the reduced-budget evaluations of successive halving."""
+    out_csv = Path(out_csv)
+    return out_csv.with_name(f"{out_csv.stem}_rungs{out_csv.suffix}")
+
+
+def run_successive_halving(
+    model: ModelName,
+    configs: Iterable[dict],
+    data: dict,
+    out_csv: Path,
+    param_cols: Sequence[str],
+    score_cols: Sequence[str] = ("WIS",),
+    *,
+    budget_param: str,
+    min_budget: int,
+    eta: int = 3,
+    n_jobs: int = -1,
+) -> pd.DataFrame:
+    """
+    Successive halving over the training budget `budget_param` (n_estimators or n_epochs).
+
+    All configs are first evaluated with their budget reduced to about `min_budget`; the best
+    1/`eta` are promoted to an `eta` times larger budget, until the survivors are evaluated with
+    their full budget. Only evaluations at a config's full budget are written to `out_csv`, which
+    `get_best_parameters` reads (on any rung: configs whose full budget is at most `min_budget`
+    reach it on the first); the reduced-budget evaluations go to `rungs_csv(out_csv)`, so a config
+    that merely looks good on a low budget is never chosen. Rows already in either file are
+    reused, full-budget rows only from `out_csv`. Returns the rows of the last rung, best first.
+    """
+    configs = list(configs)
+    low_csv = rungs_csv(out_csv)
+    max_budget = max(cfg[budget_param] for cfg in configs)
+    n_rungs = max(1, int(np.floor(np.log(max_budget / min_budget) / np.log(eta) + 1e-9)) + 1)
+
+    for rung in range(n_rungs):
+        factor = float(eta) ** (rung - n_rungs + 1)
+        candidates = [
+            {**cfg, budget_param: max(min(min_budget, cfg[budget_param]), int(round(cfg[budget_param] * factor)))}
+            for cfg in configs
+        ]
+
+        # a candidate at its config's full budget (on any rung) goes to `out_csv`, all others to
+        # `low_csv`; configs that only differ in their budget may coincide: evaluate each once
+        full = {config_hash(c): c for c, cfg in zip(candidates, configs) if c[budget_param] == cfg[budget_param]}
+        low = {config_hash(c): c for c in candidates if config_hash(c) not in full}
+        scores_full = read_gridsearch_scores(out_csv, param_cols)
+        scores = {**read_gridsearch_scores(low_csv, param_cols), **scores_full}
+        for todo, csv in [
+            ([c for h, c in full.items() if h not in scores_full], out_csv),
+            ([c for h, c in low.items() if h not in scores], low_csv),
+        ]:
+            if todo:
+                rows = evaluate_configs(
+                    model, todo, data, csv, param_cols, score_cols, n_jobs=n_jobs, desc=f"Rung {rung + 1}/{n_rungs}"
+                )
+                scores.update({config_hash({k: row[k] for k in param_cols}): row["WIS"] for row in rows})
+
+        wis = np.array([scores[config_hash(c)] for c in candidates], dtype=float)
+        order = np.argsort(np.nan_to_num(wis, nan=np.inf), kind="stable")
+        if rung == n_rungs - 1:
+            # every returned config must be selectable by `get_best_parameters`
+            missing = {config_hash(c) for c in candidates} - completed_config_hashes(out_csv, param_cols)
+            if missing:
+                raise RuntimeError(f"{len(missing)} configs of the last rung have no full-budget row in {out_csv}")
+            result = pd.DataFrame([{**candidates[i], "WIS": wis[i]} for i in order])
+            return result[list(param_cols) + ["WIS"]]
+
+        n_keep = max(1, int(np.ceil(len(configs) / eta)))
+        configs = [configs[i] for i in order[:n_keep]]
+
+
+def run_hyperband(
+    model: ModelName,
+    configs: Iterable[dict],
+    data: dict,
+    out_csv: Path,
+    param_cols: Sequence[str],
+    score_cols: Sequence[str] = ("WIS",),
+    *,
+    budget_param: str,
+    min_budget: int,
+    eta: int = 3,
+    seed: int = 1,
+    n_jobs: int = -1,
+) -> pd.DataFrame:
+    """
+    Hyperband: successive halving in several brackets that trade the number of configs for the
+    starting budget, hedging against low-budget scores being misleading.
+
+    The (shuffled) grid is split across the brackets in Hyperband's proportions; bracket `s`
+    has `s + 1` rungs and starts at `min_budget * eta**(s_max - s)`. Returns the last-rung rows of all brackets, best first.
+    """
+    configs = list(configs)
+    rng = np.random.default_rng(seed)
+    configs = [configs[i] for i in rng.permutation(len(configs))]
+
+    max_budget = max(cfg[budget_param] for cfg in configs)
+    s_max = max(0, int(np.floor(np.log(max_budget / min_budget) / np.log(eta) + 1e-9)))
+    # Hyperband's share of configs per bracket: n_s ∝ eta**s / (s + 1), s = s_max, ..., 0
+    weights = np.array([eta**s / (s + 1) for s in range(s_max, -1, -1)])
+    bounds = np.round(np.cumsum(weights) / weights.sum() * len(configs)).astype(int)
+
+    results, start = [], 0
+    for s, stop in zip(range(s_max, -1, -1), bounds):
+        bracket = configs[start:stop]
+        start = stop
+        if not bracket:
+            continue
+        print(f"Bracket s={s}: {len(bracket)} configs")
+        results.append(
+            run_successive_halving(
+                model,
+                bracket,
+                data,
+                out_csv,
+                param_cols,
+                score_cols,
+                budget_param=budget_param,
+                min_budget=min(min_budget * eta ** (s_max - s), max_budget),
+                eta=eta,
+                n_jobs=n_jobs,
+            )
+        )
+
+    return pd.concat(results, ignore_index=True).sort_values("WIS", na_position="last").reset_index(drop=True)
@@ -0,0 +1,144 @@
+import os
+import sqlite3
+from functools import lru_cache
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from config import TUNING_DB
+from src.cache import stable_hash
+
+# The grid-search CSVs stay the source of truth; the store keeps a typed, indexed copy of each
+# CSV that is re-imported whenever the file changes (size or mtime) behind its back.
+_SQL_TYPES = {"b": "BOOLEAN", "i": "INTEGER", "u": "INTEGER", "f": "REAL"}
+INDEX_COLUMNS = ("use_covariates", "sample_weight", "WIS")
+
+
+def _connect() -> sqlite3.Connection:
+    TUNING_DB.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(TUNING_DB, timeout=60, isolation_level=None)  # transactions are explicit
+    con.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+    con.execute("CREATE TABLE IF NOT EXISTS sources (csv TEXT PRIMARY KEY, tbl TEXT, size INTEGER, mtime_ns INTEGER)")
+    return con
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _csv_stat(csv: str) -> tuple[int, int]:
+    stat = os.stat(csv)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _sql_value(value):
+    if isinstance(value, (dict, list, tuple)):
+        return str(value)  # same text as in the CSV
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _insert(con: sqlite3.Connection, table: str, columns: Sequence[str], rows) -> None:
+    sql = f"INSERT INTO {_quote(table)} ({', '.join(map(_quote, columns))}) VALUES ({', '.join('?' * len(columns))})"
+    con.executemany(sql, ([_sql_value(v) for v in row] for row in rows))
+
+
+def _import_csv(con: sqlite3.Connection, csv: str, table: str) -> None:
+    gs = pd.read_csv(csv)
+    con.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+    con.execute(
+        f"CREATE TABLE {_quote(table)} ({', '.join(f'{_quote(c)} {_SQL_TYPES.get(gs[c].dtype.kind, "TEXT")}' for c in gs.columns)})"
+    )
+    index = [c for c in INDEX_COLUMNS if c in gs.columns]
+    if index:
+        con.execute(f"CREATE INDEX {_quote(table + '_best')} ON {_quote(table)} ({', '.join(map(_quote, index))})")
+    _insert(con, table, list(gs.columns), gs.itertuples(index=False, name=None))
+
+
+def sync_results(con: sqlite3.Connection, csv: str) -> str:
+    """Name of the table holding the rows of the grid-search CSV `csv`, re-imported if the file changed."""
+    stat = _csv_stat(csv)
+    source = con.execute("SELECT tbl, size, mtime_ns FROM sources WHERE csv = ?", (csv,)).fetchone()
+    if source is not None and tuple(source[1:]) == stat:
+        return source[0]
+
+    table = "results_" + stable_hash(csv)
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        stat = _csv_stat(csv)  # appends take the same lock, so the file is stable from here on
+        _import_csv(con, csv, table)
+        con.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (csv, table, *stat))
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+    return table
+
+
+def append_result(csv, row: dict, header: Sequence[str]) -> None:
+    """
+    Append `row` to the grid-search CSV `csv` and to its table in the store.
+
+    Both writes happen under the store's write lock, so parallel tuning runs can append to the
+    same CSV. If the table is stale, has other columns or is still empty (its column types are
+    inferred from the data) only the CSV is written; the table is re-imported on the next read.
+    """
+    csv = str(Path(csv).resolve())
+    con = _connect()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            source = con.execute("SELECT tbl, size, mtime_ns FROM sources WHERE csv = ?", (csv,)).fetchone()
+            in_sync = source is not None and tuple(source[1:]) == _csv_stat(csv)
+
+            pd.DataFrame([row], columns=list(header)).to_csv(csv, mode="a", header=False, index=False)
+
+            if in_sync:
+                table = source[0]
+                columns = [c[1] for c in con.execute(f"PRAGMA table_info({_quote(table)})")]
+                typed = con.execute(f"SELECT 1 FROM {_quote(table)} LIMIT 1").fetchone() is not None
+                if typed and columns == list(header):
+                    _insert(con, table, columns, [[row.get(c) for c in columns]])
+                    con.execute("UPDATE sources SET size = ?, mtime_ns = ? WHERE csv = ?", (*_csv_stat(csv), csv))
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+
+
+@lru_cache(maxsize=64)
+def _best_result(csv: str, stat: tuple[int, int], filters: tuple) -> dict | None:
+    con = _connect()
+    try:
+        table = sync_results(con, csv)
+        info = con.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+        names, types = [c[1] for c in info], [c[2] for c in info]
+        filters = [(c, v) for c, v in filters if c in names]
+        where = " AND ".join(["WIS IS NOT NULL"] + [f"{_quote(c)} = ?" for c, _ in filters])
+        row = con.execute(
+            f"SELECT * FROM {_quote(table)} WHERE {where} ORDER BY WIS, rowid LIMIT 1",
+            [_sql_value(v) for _, v in filters],
+        ).fetchone()
+    finally:
+        con.close()
+
+    if row is None:
+        return None
+    return {n: bool(v) if t == "BOOLEAN" and v is not None else v for n, t, v in zip(names, types, row)}
+
+
+def best_result(csv, **filters) -> dict | None:
+    """
+    Row of the grid-search CSV `csv` with the lowest WIS among the rows matching `filters`
+    (column=value; unknown columns are ignored), or None. Memoized until the file changes.
+    """
+    csv = str(Path(csv).resolve())
+    best = _best_result(csv, _csv_stat(csv), tuple(sorted(filters.items())))
+    return None if best is None else dict(best)